@@ -0,0 +1,175 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+from models import db, Show, Artist, Venue, Genre, venue_genre, artist_genre
+from queries import db_time, venue_detail, artist_detail
+from database import request_replica
+
+#----------------------------------------------------------------------------#
+# Async detail queries.
+#
+# With ASYNC_VIEWS enabled the venue and artist pages load the object, its
+# genres, its upcoming shows and its past shows as four independent queries
+# run concurrently with asyncio.gather, each on its own connection of an
+# asyncio engine (asyncpg on Postgres, aiosqlite on SQLite). The engines
+# live on one event loop per process, run by a background thread, so their
+# pools (sized by the DB_POOL_* settings) keep connections open across
+# requests; a view hands its coroutine to that loop and waits for it, for
+# at most DB_POOL_TIMEOUT plus DB_STATEMENT_TIMEOUT_MS. Reads go to the
+# replica the request's session would read from, if any.
+#
+# Needs `pip install asyncpg` (or aiosqlite).
+#----------------------------------------------------------------------------#
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+DETAILS = {
+    # model: (genre association, association key, show key, other side, show key of the other side, prefix)
+    Venue: (venue_genre, 'venue_id', Show.venue_id, Artist, Show.artist_id, 'artist'),
+    Artist: (artist_genre, 'artist_id', Show.artist_id, Venue, Show.venue_id, 'venue'),
+}
+
+
+class EventLoopThread(object):
+    # A process-wide event loop on a daemon thread, and the async engines
+    # bound to it. A forked worker starts its own on first use, since the
+    # parent's thread and connections do not survive the fork.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.loop = None
+        self.engines = {}
+
+    def start(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.loop = asyncio.new_event_loop()
+                self.engines = {}
+                threading.Thread(target=self.loop.run_forever, name='aio', daemon=True).start()
+                self.pid = os.getpid()
+
+    def engine(self, config, url):
+        self.start()
+        key = str(url)
+        with self.lock:
+            engine = self.engines.get(key)
+            if engine is None:
+                from sqlalchemy.ext.asyncio import create_async_engine
+                engine = self.engines[key] = create_async_engine(url, **async_engine_options(config, url))
+        return engine
+
+    def run(self, coroutine, timeout):
+        # Waits at most `timeout` seconds, so a stalled or dead loop fails
+        # the request instead of hanging its thread.
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+
+event_loop = EventLoopThread()
+
+
+def async_engine_options(config, url):
+    if url.get_backend_name() != 'postgresql':
+        return {}
+    if config.get('DB_PGBOUNCER', False):
+        # PgBouncer in transaction mode does the pooling, and cannot keep
+        # asyncpg's prepared statements on one server connection.
+        return {
+            'poolclass': NullPool,
+            'connect_args': {'statement_cache_size': 0, 'prepared_statement_cache_size': 0},
+        }
+    options = {
+        'pool_size': config.get('DB_POOL_SIZE', 10),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+    }
+    statement_timeout = config.get('DB_STATEMENT_TIMEOUT_MS')
+    if statement_timeout:
+        options['connect_args'] = {'server_settings': {'statement_timeout': str(statement_timeout)}}
+    return options
+
+
+def run_timeout(config):
+    # Long enough to wait for a pooled connection and then run a query.
+    return config.get('DB_POOL_TIMEOUT', 30) + config.get('DB_STATEMENT_TIMEOUT_MS', 30000) / 1000.0
+
+
+def async_url(url):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def read_engine():
+    # The async engine for the database this request reads from: the
+    # replica picked for it, or the primary (ASYNC_DATABASE_URI if set).
+    config = current_app.config
+    replica = request_replica(db, db.session())
+    if replica is not None:
+        url = replica.url
+    else:
+        url = config.get('ASYNC_DATABASE_URI') or db.engine.url
+    return event_loop.engine(config, async_url(url))
+
+
+async def fetch_all(engine, statement):
+    async with engine.connect() as connection:
+        return (await connection.execute(statement)).all()
+
+
+async def fetch_detail(engine, model, object_id, now):
+    association, key, show_key, other, other_key, prefix = DETAILS[model]
+    now = db_time(now)
+    shows = select(
+        other.id.label(prefix + '_id'),
+        other.name.label(prefix + '_name'),
+        other.image_link.label(prefix + '_image_link'),
+        Show.start_time
+    ).join(other, other.id == other_key).where(show_key == object_id)
+
+    rows, genres, past_shows, upcoming_shows = await asyncio.gather(
+        fetch_all(engine, select(model.__table__).where(model.id == object_id)),
+        fetch_all(engine, select(Genre.name).join(association, association.c.genre_id == Genre.id).where(
+            association.c[key] == object_id
+        ).order_by(Genre.name)),
+        fetch_all(engine, shows.where(Show.start_time < now).order_by(Show.start_time)),
+        fetch_all(engine, shows.where(Show.start_time >= now).order_by(Show.start_time))
+    )
+    if not rows:
+        return None
+    return (
+        rows[0],
+        [genre.name for genre in genres],
+        [row._asdict() for row in past_shows],
+        [row._asdict() for row in upcoming_shows]
+    )
+
+
+async def async_venue_detail(engine, venue_id, now):
+    detail = await fetch_detail(engine, Venue, venue_id, now)
+    return venue_detail(*detail) if detail else None
+
+
+async def async_artist_detail(engine, artist_id, now):
+    detail = await fetch_detail(engine, Artist, artist_id, now)
+    return artist_detail(*detail) if detail else None
+
+
+def get_venue_detail_concurrently(venue_id, now):
+    return event_loop.run(async_venue_detail(read_engine(), venue_id, now), run_timeout(current_app.config))
+
+
+def get_artist_detail_concurrently(artist_id, now):
+    return event_loop.run(async_artist_detail(read_engine(), artist_id, now), run_timeout(current_app.config))
@@ -0,0 +1,202 @@
+import hashlib
+from datetime import date
+from flask import Blueprint, current_app, request, jsonify, abort, stream_with_context
+from models import db, Venue, Artist, Show, Genre, venue_genre, artist_genre
+from bulk import IMPORTS, EXPORT_FORMATS, export_chunks
+from queries import (
+    request_now, get_venue_detail, get_artist_detail, ShowsPage, decode_show_cursor,
+    collection_version, shows_version, detail_version
+)
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+VENUE_FIELDS = (
+    'id', 'name', 'city', 'state', 'address', 'phone', 'image_link',
+    'facebook_link', 'website', 'seeking_talent', 'seeking_description', 'genres'
+)
+ARTIST_FIELDS = (
+    'id', 'name', 'city', 'state', 'phone', 'image_link',
+    'facebook_link', 'website', 'seeking_venue', 'seeking_description', 'genres'
+)
+
+
+def make_etag(version):
+    return hashlib.sha1(repr(version).encode()).hexdigest()
+
+
+def not_modified(etag):
+    # True when the client already holds this version; checked before any
+    # rows are fetched for the body.
+    return request.if_none_match.contains_weak(etag)
+
+
+def conditional(version, build):
+    # `version` is one of the cheap versions from queries.py; for the list
+    # endpoints a table_version lookup, the same for every page.
+    if version is None:
+        abort(404)
+    etag = make_etag(version)
+    if not_modified(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(to_json(build()))
+    response.set_etag(etag)
+    return response
+
+
+def requested_fields(allowed):
+    fields = request.args.get('fields')
+    if not fields:
+        return list(allowed)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = set(fields) - set(allowed)
+    if unknown:
+        abort(400, 'Unknown fields: ' + ', '.join(sorted(unknown)))
+    return fields
+
+
+def page_size():
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    return max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+
+
+def sparse(data, fields):
+    return {field: data[field] for field in fields}
+
+
+def to_json(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_json(item) for item in value]
+    return value
+
+
+def list_resources(model, association, key, allowed):
+    # One keyset page ordered by id, selecting only the requested columns;
+    # genres, if asked for, come from a single query for the whole page.
+    fields = requested_fields(allowed)
+    limit = page_size()
+    columns = [getattr(model, field) for field in fields if field not in ('id', 'genres')]
+    query = db.session.query(model.id, *columns)
+
+    genre = request.args.get('genre')
+    if genre:
+        query = query.join(association, association.c[key] == model.id).join(
+            Genre, Genre.id == association.c.genre_id
+        ).filter(Genre.name == genre)
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            query = query.filter(model.id > int(cursor))
+        except ValueError:
+            abort(400, 'Invalid cursor')
+    rows = query.order_by(model.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1].id)
+
+    data = [row._asdict() for row in rows]
+    if 'genres' in fields:
+        genres = {}
+        for owner_id, name in db.session.query(association.c[key], Genre.name).join(
+            Genre, Genre.id == association.c.genre_id
+        ).filter(association.c[key].in_([item['id'] for item in data])).order_by(Genre.name):
+            genres.setdefault(owner_id, []).append(name)
+        for item in data:
+            item['genres'] = genres.get(item['id'], [])
+
+    return {
+        'data': [sparse(item, fields) for item in data],
+        'next_cursor': next_cursor
+    }
+
+
+#----------------------------------------------------------------------------#
+# Endpoints.
+#----------------------------------------------------------------------------#
+
+@api.route('/venues')
+def venues():
+    return conditional(
+        collection_version(Venue),
+        lambda: list_resources(Venue, venue_genre, 'venue_id', VENUE_FIELDS)
+    )
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    now = request_now()
+
+    def build():
+        data = get_venue_detail(venue_id, now)
+        return sparse(data, requested_fields(data.keys()))
+    return conditional(
+        detail_version(Venue, Show.venue_id, Artist, Show.artist_id, venue_id, now),
+        build
+    )
+
+
+@api.route('/artists')
+def artists():
+    return conditional(
+        collection_version(Artist),
+        lambda: list_resources(Artist, artist_genre, 'artist_id', ARTIST_FIELDS)
+    )
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    now = request_now()
+
+    def build():
+        data = get_artist_detail(artist_id, now)
+        return sparse(data, requested_fields(data.keys()))
+    return conditional(
+        detail_version(Artist, Show.artist_id, Venue, Show.venue_id, artist_id, now),
+        build
+    )
+
+
+@api.route('/shows')
+def shows():
+    def build():
+        fields = None
+        after = request.args.get('cursor')
+        if after:
+            try:
+                after = decode_show_cursor(after)
+            except ValueError:
+                abort(400, 'Invalid cursor')
+        page = ShowsPage(page_size(), after=after or None)
+        data = []
+        for show in page:
+            if fields is None:
+                fields = requested_fields(show.keys())
+            data.append(sparse(show, fields))
+        return {'data': data, 'next_cursor': page.next_cursor}
+    return conditional(shows_version(), build)
+
+
+@api.route('/export/<kind>.<format>')
+def export(kind, format):
+    if kind not in IMPORTS or format not in EXPORT_FORMATS:
+        abort(404)
+    mimetype = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    return current_app.response_class(
+        stream_with_context(export_chunks(kind, format)), mimetype=mimetype
+    )
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def api_error(error):
+    return jsonify({'error': error.description}), error.code
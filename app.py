@@ -3,9 +3,12 @@
 #----------------------------------------------------------------------------#
 
 import json
+from datetime import datetime, timedelta
+from functools import lru_cache
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify
+from babel import Locale
+from babel.dates import parse_pattern
+from flask import Flask, render_template, stream_template, request, Response, flash, redirect, url_for, abort, jsonify
 from flask_moment import Moment
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
@@ -14,7 +17,27 @@ from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
 import sys
-from models import db, Show, Artist, Venue
+from models import db, Show, Artist, Venue, Genre
+from queries import (
+  request_now, get_venue_directory, get_venue_detail, get_artists, get_artist_detail,
+  ShowsPage, decode_show_cursor, collection_version, shows_version, detail_version,
+  db_time, parse_calendar_bound, get_show_calendar
+)
+from search import search_by_name
+from aio import get_venue_detail_concurrently, get_artist_detail_concurrently
+from cache import page_cache
+from api import api, to_json
+from bulk import import_command, export_command
+from rollups import rollups_command
+from instrumentation import sql_instrumentation
+from metrics import metrics
+import templating
+from assets import assets, assets_command
+from conditional import conditional
+from bookings import default_end, find_conflicts, shows_command
+from compression import Compress
+from seed import seed_command
+from benchmark import bench_command
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -22,8 +45,26 @@ from models import db, Show, Artist, Venue
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
+templating.init_app(app)
+assets.init_app(app)
 db.init_app(app)
 migrate = Migrate(app, db)
+page_cache.init_app(app)
+sql_instrumentation.init_app(app)
+metrics.init_app(app)
+app.register_blueprint(api)
+if app.config['COMPRESS_ENABLED']:
+  app.wsgi_app = Compress(
+    app.wsgi_app, min_size=app.config['COMPRESS_MIN_SIZE'], level=app.config['COMPRESS_LEVEL']
+  )
+app.cli.add_command(import_command)
+app.cli.add_command(export_command)
+app.cli.add_command(rollups_command)
+app.cli.add_command(templating.templates_command)
+app.cli.add_command(assets_command)
+app.cli.add_command(shows_command)
+app.cli.add_command(seed_command)
+app.cli.add_command(bench_command)
 
 # TODO: connect to a local postgresql database
 
@@ -34,16 +75,82 @@ migrate = Migrate(app, db)
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+@lru_cache(maxsize=None)
+def compiled_datetime_format(format, locale):
+  # Babel patterns and locales are parsed once per (format, locale).
+  return parse_pattern(DATETIME_FORMATS.get(format, format)), Locale.parse(locale)
+
+def format_datetime(value, format='medium', locale='en'):
+  # Accepts datetime objects as-is; only strings need to be parsed.
+  if not isinstance(value, datetime):
+    value = dateutil.parser.parse(value)
+  pattern, locale = compiled_datetime_format(format, locale)
+  return pattern.apply(value, locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+@metrics.collector
+def pool_metrics():
+  pool = db.engine.pool
+  if not hasattr(pool, 'overflow'):
+    return []
+  return [
+    ('gauge', 'fyyur_db_pool_size', (), pool.size()),
+    ('gauge', 'fyyur_db_pool_checked_out', (), pool.checkedout()),
+    ('gauge', 'fyyur_db_pool_overflow', (), pool.overflow()),
+  ]
+
+@metrics.collector
+def replica_metrics():
+  if db.replicas is None:
+    return []
+  return [
+    ('gauge', 'fyyur_db_replica_up', (('replica', key),), int(up))
+    for key, up in db.replicas.status()
+  ]
+
+@metrics.collector
+def cache_metrics():
+  return [
+    ('counter', 'fyyur_cache_{}_total'.format(name), (), value)
+    for name, value in page_cache.stats().items()
+  ]
+
+#----------------------------------------------------------------------------#
+# Cache invalidation.
+#----------------------------------------------------------------------------#
+
+def invalidate_venue_pages(venue_id):
+  # Venue names also appear on /shows and on the pages of artists who play there.
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  page_cache.invalidate(
+    url_for('venues'), url_for('show_venue', venue_id=venue_id), url_for('shows'),
+    *[url_for('show_artist', artist_id=row.artist_id) for row in artist_ids]
+  )
+
+def invalidate_artist_pages(artist_id):
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  page_cache.invalidate(
+    url_for('artists'), url_for('show_artist', artist_id=artist_id), url_for('shows'),
+    *[url_for('show_venue', venue_id=row.venue_id) for row in venue_ids]
+  )
+
+def invalidate_show_pages(show):
+  page_cache.invalidate(
+    url_for('shows'), url_for('venues'),
+    url_for('show_venue', venue_id=show.venue_id),
+    url_for('show_artist', artist_id=show.artist_id)
+  )
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -57,116 +164,34 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@conditional(lambda: collection_version(Venue))
+@page_cache.cached
 def venues():
-    data_set = []
-    venues = Venue.query.all()
-    places = set()
-    for venue in venues:
-        places.add((venue.city, venue.state))
-    for place in places:
-        data_set.append({
-            "city": place[0],
-            "state": place[1],
-            "venues": []
-        })
-    for venue in venues:
-        for i in data_set:
-            if i['city'] == venue.city and i['state'] == venue.state:
-                upcoming_shows = Show.query.filter(Show.venue_id == venue.id).filter(
-                    Show.start_time > datetime.utcnow())
-                venues_data = {
-                  'id': venue.id,
-                  'name': venue.name,
-                  'upcoming_shows': upcoming_shows.count()
-                }
-                i['venues'].append(venues_data)
+    data_set = get_venue_directory(genre=request.args.get('genre'))
     return render_template('pages/venues.html', areas=data_set)
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
-  search = request.form.get("search_term")
-  venues = Venue.query.filter(
-    Venue.name.ilike('%' + search + '%')
-  ).all()
-  venues_list = []
-
-  for venue in venues:
-    upcoming_shows = Show.query.filter(Show.venue_id == venue.id).all()
-    data = {
-      "id": venue.id,
-      "name": venue.name,
-      "upcoming_shows": len(upcoming_shows)
-    }
-    venues_list.append(data)
-
-  response = {
-    "count": len(venues),
-    "data": venues_list
-  }
-
+  search = request.form.get("search_term", '')
+  response = search_by_name(
+    Venue, search,
+    limit=request.values.get('limit', type=int),
+    offset=request.values.get('offset', type=int)
+  )
   return render_template('pages/search_venues.html', results=response, search_term=search)
 
 @app.route('/venues/<int:venue_id>')
+@conditional(lambda venue_id: detail_version(
+  Venue, Show.venue_id, Artist, Show.artist_id, venue_id, request_now()
+))
+@page_cache.cached
 def show_venue(venue_id):
-  data_set = []
-  venue = Venue.query.get(venue_id)
-  now = datetime.now()
-  if not venue:
-    abort(404)
-    
-  upcoming_shows_query = db.session.query(Show).join(Artist).filter(Show.venue_id==venue.id).filter(Show.start_time>datetime.now()).all()
-  upcoming_shows = []
-
-  for show in upcoming_shows_query:
-    artist = Artist.query.filter(Artist.id == show.artist_id).first()
-
-    upcoming_shows.append({
-      'artist_id': artist.id,
-      'artist_name': artist.name,
-      'artist_image': artist.image_link,
-      'start_time': format_datetime(value=str(show.start_time), format="full")
-    })
-  
-  past_shows_query = db.session.query(Show).join(Artist).filter(Show.venue_id==venue.id).filter(Show.start_time<datetime.now()).all()
-  past_shows = []
-
-  for show in past_shows_query:
-    artist = Artist.query.filter(Artist.id == show.artist_id).first()
-
-    past_shows.append({
-      'artist_id': artist.id,
-      'artist_name': artist.name,
-      'artist_image': artist.image_link,
-      'start_time': format_datetime(value=str(show.start_time), format="full")
-    })
-
-  if venue.genres:
-    genres = venue.genres.split(',')
+  if app.config['ASYNC_VIEWS']:
+    data = get_venue_detail_concurrently(venue_id, request_now())
   else:
-    genres=''
-
-  data = {
-      "id": venue.id,
-      "name": venue.name,
-      "address": venue.address,
-      "city": venue.city,
-      "state": venue.state,
-      "phone": venue.phone,
-      "genres": genres,
-      "website": venue.website,
-      "facebook_link": venue.facebook_link,
-      "seeking_talent": venue.seeking_talent,
-      "seeking_description": venue.seeking_description,
-      "image_link": venue.image_link,
-      "past_shows": past_shows,
-      "upcoming_shows": upcoming_shows,
-      "past_shows_count": len(past_shows),
-      "upcoming_shows_count": len(upcoming_shows),
-    }
-  
-  data_set.append(data)
-
-  data = list(filter(lambda d: d['id'] == venue_id, data_set))[0]
+    data = get_venue_detail(venue_id, request_now())
+  if not data:
+    abort(404)
   return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
@@ -186,7 +211,7 @@ def create_venue_submission():
     city = form.city.data,
     state= form.state.data,
     phone= form.phone.data,
-    genres= ",".join(form.genres.data),
+    genres= Genre.from_names(form.genres.data),
     facebook_link= form.facebook_link.data,
     seeking_description= form.seeking_description.data,
     website= form.website_link.data,
@@ -197,6 +222,7 @@ def create_venue_submission():
     try:
         db.session.add(new_venue)
         db.session.commit()
+        page_cache.invalidate(url_for('venues'))
         flash('Venue ' + new_venue.name + ' was successfully listed!')
     except:
         db.session.rollback()
@@ -214,11 +240,12 @@ def create_venue_submission():
 def delete_venue(venue_id):
   venue = Venue.query.get(venue_id)
   try:
-    Venue.query.filter_by(Venue.id==venue_id).delete()
+    invalidate_venue_pages(venue_id)
+    Venue.query.filter(Venue.id==venue_id).delete()
     db.session.commit()
   except:
     db.session.rollback()
-    flash('Venue' + venue['name'] + 'unable to be deleted')
+    flash('Venue' + venue.name + 'unable to be deleted')
     abort(500)
   finally:
     db.session.close()
@@ -228,105 +255,35 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@conditional(lambda: collection_version(Artist))
+@page_cache.cached
 def artists():
-  artists = Artist.query.all()
-  data = []
-  for artist in artists:
-    person = {
-      "id": artist.id,
-      "name": artist.name
-    }
-    data.append(person)
-  
+  data = get_artists(genre=request.args.get('genre'))
   return render_template('pages/artists.html', artists=data)
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  search = request.form.get('search_term')
-  artists = Artist.query.filter(
-    Artist.name.ilike('%' + search + '%' )
-  ).all()
-  artists_list = []
-
-  for artist in artists:
-    upcoming_shows = Show.query.filter(Show.artist_id == artist.id, Show.start_time > datetime.now()).all()
-    person = {
-      "id": artist.id,
-      "name": artist.name,
-      "upcoming_shows": len(upcoming_shows)
-    }
-    artists_list.append(person)
-
-  response = {
-    "count": len(artists),
-    "data": artists_list
-  }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  search = request.form.get('search_term', '')
+  response = search_by_name(
+    Artist, search,
+    limit=request.values.get('limit', type=int),
+    offset=request.values.get('offset', type=int)
+  )
+  return render_template('pages/search_artists.html', results=response, search_term=search)
 
 @app.route('/artists/<int:artist_id>')
+@conditional(lambda artist_id: detail_version(
+  Artist, Show.artist_id, Venue, Show.venue_id, artist_id, request_now()
+))
+@page_cache.cached
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
-  # TODO: replace with real artist data from the artist table, using artist_id
- 
-  data_set=[]
-  artists= Artist.query.all()
-  for artist in artists:
-    past_shows= []
-    past_shows_query = db.session.query(Show).join(Venue).filter(Show.artist_id==artist.id).filter(Show.start_time<datetime.now()).all()
-    for shows in past_shows_query:
-      venue = Venue.query.filter(Venue.id==shows.venue_id).first()
-
-      show_detail={
-        "venue_id": venue.id,
-        "venue_name": venue.name,
-        "venue_image_link": venue.image_link,
-        "start_time": shows.start_time.strftime("%m/%d/%Y, %H:%M:%S")
-      }
-      past_shows.append(show_detail)
-
-    upcoming_shows= []
-    upcoming_shows_query = db.session.query(Show).join(Venue).filter(Show.artist_id==artist.id).filter(Show.start_time>datetime.now()).all()
-    for shows in upcoming_shows_query:
-      venue= Venue.query.filter(Venue.id==shows.venue_id).first()
-
-      show_detail={
-        "venue_id": venue.id,
-        "venue_name": venue.name,
-        "venue_image_link": venue.image_link,
-        "start_time": shows.start_time.strftime("%m/%d/%Y, %H:%M:%S")
-      }
-      upcoming_shows.append(show_detail)
-        
-   
-    if artist.genres:
-      genres= artist.genres.split(",")
-    else:
-      genres=""
-
-
-    data={
-      "id": artist.id,
-      "name": artist.name,
-      "city": artist.city,
-      "address"
-      "state": artist.state,
-      "phone": artist.phone,
-      "website": artist.website,
-      "genres": genres,
-      "facebook_link": artist.facebook_link,
-      "seeking_venue": artist.seeking_venue,
-      "seeking_description": artist.seeking_description,
-      "image_link": artist.image_link,
-      "facebook_link": artist.facebook_link,
-      "past_shows": past_shows,
-      "upcoming_shows": upcoming_shows,
-      "past_shows_count": len(past_shows),
-      "upcoming_shows_count": len(upcoming_shows),
-    }
-   
-    data_set.append(data)
-  data = list(filter(lambda d: d['id'] == artist_id, data_set))[0]
+  if app.config['ASYNC_VIEWS']:
+    data = get_artist_detail_concurrently(artist_id, request_now())
+  else:
+    data = get_artist_detail(artist_id, request_now())
+  if not data:
+    abort(404)
   return render_template('pages/show_artist.html', artist=data)
 #  Update
 #  ----------------------------------------------------------------
@@ -339,7 +296,7 @@ def edit_artist(artist_id):
   artist={
     'id': edit_artist.id,
     'name':edit_artist.name,
-    'genres': edit_artist.genres.split(','),
+    'genres': [genre.name for genre in edit_artist.genres],
     'city': edit_artist.city,
     'state': edit_artist.state,
     'phone': edit_artist.phone,
@@ -365,7 +322,7 @@ def edit_artist_submission(artist_id):
       artist.name = form.name.data
       artist.city = form.city.data
       artist.state= form.state.data
-      artist.genres=",".join(form.genres.data)
+      artist.genres=Genre.from_names(form.genres.data)
       artist.phone= form.phone.data
       artist.facebook_link= form.facebook_link.data
       artist.seeking_description= form.seeking_description.data
@@ -374,6 +331,7 @@ def edit_artist_submission(artist_id):
       artist.seeking_venue = form.seeking_venue.data
    
       db.session.commit()
+      invalidate_artist_pages(artist_id)
       # on successful db insert, flash success
       flash('Artist ' + artist.name + ' was successfully updated!') 
 
@@ -398,7 +356,7 @@ def edit_venue(venue_id):
   venue={
     'id': edit_venue.id,
     'name':edit_venue.name,
-    'genres': edit_venue.genres.split(','),
+    'genres': [genre.name for genre in edit_venue.genres],
     'city': edit_venue.city,
     'address':edit_venue.address,
     'state': edit_venue.state,
@@ -426,7 +384,7 @@ def edit_venue_submission(venue_id):
       venue.city = form.city.data
       venue.state= form.state.data
       venue.address= form.address.data
-      venue.genres=",".join(form.genres.data)
+      venue.genres=Genre.from_names(form.genres.data)
       venue.phone= form.phone.data
       venue.facebook_link= form.facebook_link.data
       venue.seeking_description= form.seeking_description.data
@@ -435,6 +393,7 @@ def edit_venue_submission(venue_id):
       venue.seeking_talent = form.seeking_talent.data
    
       db.session.commit()
+      invalidate_venue_pages(venue_id)
       # on successful db insert, flash success
       flash('Venue ' + venue.name + ' was successfully updated!') 
 
@@ -469,7 +428,7 @@ def create_artist_submission():
     city = form.city.data,
     state= form.state.data,
     phone= form.phone.data,
-    genres= ",".join(form.genres.data),
+    genres= Genre.from_names(form.genres.data),
     facebook_link= form.facebook_link.data,
     seeking_description= form.seeking_description.data,
     website= form.website_link.data,
@@ -479,6 +438,7 @@ def create_artist_submission():
     try:
         db.session.add(new_artist)
         db.session.commit()
+        page_cache.invalidate(url_for('artists'))
         flash('Artist ' + new_artist.name + ' was successfully listed!')
     except:
         db.session.rollback()
@@ -496,28 +456,46 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
+CALENDAR_ARGS = ('from', 'to', 'city', 'state', 'genre')
+
+def show_calendar():
+  # /shows?from=&to=&city=&state=&genre= lists the shows in a time range,
+  # by day; from defaults to today and to to CALENDAR_DEFAULT_DAYS later.
+  today = datetime.combine(db_time(request_now()).date(), datetime.min.time())
+  try:
+    start = parse_calendar_bound(request.args['from']) if request.args.get('from') else today
+    end = parse_calendar_bound(request.args['to'], end=True) if request.args.get('to') else \
+      start + timedelta(days=app.config['CALENDAR_DEFAULT_DAYS'])
+  except ValueError:
+    abort(400)
+  if end <= start or end - start > timedelta(days=app.config['CALENDAR_MAX_DAYS']):
+    abort(400)
+  calendar = get_show_calendar(
+    start, end,
+    city=request.args.get('city'), state=request.args.get('state'), genre=request.args.get('genre'),
+    limit=app.config['CALENDAR_MAX_SHOWS']
+  )
+  if request.args.get('format') == 'json':
+    return jsonify(to_json(calendar))
+  return render_template('pages/show_calendar.html', calendar=calendar, filters=request.args)
+
 @app.route('/shows')
+@conditional(lambda: shows_version() + (request_now().date(),))
+@page_cache.cached
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  data = []
-  shows = Show.query.all()
- 
-
-  for show in shows:
-    venue = show.venue
-    artist = show.artist
-    show_detail = {
-      "venue_id": show.venue_id,
-      "venue_name": venue.name,
-      "artist_id": show.artist_id,
-      "artist_name": artist.name,
-      "artist_image_link": artist.image_link,
-      "start_time": show.start_time.strftime("%m/%d/%Y, %H:%M:%S")
-    }
-   
-    data.append(show_detail)
-  return render_template('pages/shows.html', shows=data)
+  if any(request.args.get(arg) for arg in CALENDAR_ARGS):
+    return show_calendar()
+  # displays one keyset page of shows at /shows, oldest first
+  after = request.args.get('after')
+  if after:
+    try:
+      after = decode_show_cursor(after)
+    except ValueError:
+      abort(400)
+  page = ShowsPage(app.config['SHOWS_PER_PAGE'], after=after or None)
+  if app.config['STREAM_SHOWS']:
+    return Response(stream_template('pages/shows.html', shows=page))
+  return render_template('pages/shows.html', shows=page)
 
 @app.route('/shows/create')
 def create_shows():
@@ -537,8 +515,17 @@ def create_show_submission():
       show.artist_id = form.artist_id.data
       show.venue_id = form.venue_id.data
       show.start_time = form.start_time.data
+      show.end_time = form.end_time.data or default_end(show.start_time)
+      conflicts = find_conflicts(show.venue_id, show.artist_id, show.start_time, show.end_time)
+      if conflicts:
+        flash('Show was not listed: it overlaps ' + ', '.join(
+          '{} at {} ({})'.format(other.artist.name, other.venue.name, format_datetime(other.start_time))
+          for other in conflicts
+        ))
+        return render_template('pages/home.html')
       db.session.add(show)
       db.session.commit()
+      invalidate_show_pages(show)
       flash('Show was successfully listed!')
     except:
       db.session.rollback()
@@ -546,15 +533,25 @@ def create_show_submission():
       flash('Show failed to be listed')
     finally:
       db.session.close()
+  else:
+    flash('Show could not be listed: ' + '; '.join(
+      error for errors in form.errors.values() for error in errors
+    ))
 
   return render_template('pages/home.html')
 
+@app.route('/cache/stats')
+def cache_stats():
+  return jsonify(page_cache.stats())
+
 @app.errorhandler(404)
 def not_found_error(error):
+    metrics.count_error(404)
     return render_template('errors/404.html'), 404
 
 @app.errorhandler(500)
 def server_error(error):
+    metrics.count_error(500)
     return render_template('errors/500.html'), 500
 
 
@@ -0,0 +1,246 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import time
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#
+# `flask assets build` writes to static/dist/:
+#   - every file under static/ copied to a content-hashed name
+#     (img/front-splash.jpg -> dist/img/front-splash.3f2a9c1e.jpg),
+#   - the BUNDLES, each concatenated and minified into one hashed file,
+#     with url() references in CSS pointing at the hashed files,
+#   - .gz (and, with the brotli package installed, .br) variants of
+#     compressible files,
+#   - manifest.json, mapping source paths and bundle names to the built
+#     files.
+# Templates link assets through static_url() and bundle_urls(). Once a
+# manifest exists (and outside debug) they point at the hashed files, which
+# are served with far-future immutable caching and a precompressed variant
+# when the client accepts one; otherwise they point at the source files.
+#----------------------------------------------------------------------------#
+
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    'body.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.eot', '.ttf', '.otf')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+#  Minification
+#  ----------------------------------------------------------------
+#  rcssmin and rjsmin are used when installed. Without them CSS gets a
+#  conservative comment and whitespace strip and JS is only concatenated
+#  (every library shipped here is already minified).
+
+def minify_css(text):
+    try:
+        import rcssmin
+        return rcssmin.cssmin(text)
+    except ImportError:
+        pass
+    text = re.sub(r'/\*(?!!).*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    return re.sub(r'\s*([{};,])\s*', r'\1', text).strip()
+
+
+def minify_js(text):
+    try:
+        import rjsmin
+        return rjsmin.jsmin(text)
+    except ImportError:
+        return text
+
+
+#  Build
+#  ----------------------------------------------------------------
+
+def hashed_name(path, content):
+    root, ext = posixpath.splitext(path)
+    return '{}/{}.{}{}'.format(DIST, root, hashlib.sha256(content).hexdigest()[:12], ext)
+
+
+def write_asset(static_folder, name, content):
+    target = os.path.join(static_folder, name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as f:
+        f.write(content)
+    if name.endswith(COMPRESSIBLE):
+        with open(target + '.gz', 'wb') as f:
+            f.write(gzip.compress(content, 9, mtime=0))
+        if brotli is not None:
+            with open(target + '.br', 'wb') as f:
+                f.write(brotli.compress(content))
+
+
+def source_files(static_folder):
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder:
+            dirs[:] = [name for name in dirs if name != DIST]
+        for name in files:
+            if not name.startswith('.'):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, static_folder).replace(os.sep, '/')
+
+
+def rewrite_css_urls(text, source, manifest, static_url_path):
+    # Relative url()s are resolved against the source file and pointed at
+    # the hashed copy, or at the original file if there is none.
+    def replace(match):
+        url = match.group(2)
+        if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+        return 'url("{}/{}{}")'.format(static_url_path, manifest.get(path, path), suffix)
+    return CSS_URL.sub(replace, text)
+
+
+def build(static_folder, static_url_path):
+    dist = os.path.join(static_folder, DIST)
+    shutil.rmtree(dist, ignore_errors=True)
+
+    manifest = {}
+    for path in sorted(source_files(static_folder)):
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            content = f.read()
+        name = hashed_name(path, content)
+        write_asset(static_folder, name, content)
+        manifest[path] = name
+
+    for bundle, sources in BUNDLES.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+                text = f.read()
+            if bundle.endswith('.css'):
+                parts.append(minify_css(rewrite_css_urls(text, source, manifest, static_url_path)))
+            else:
+                # A newline and semicolon keep a file without a trailing
+                # semicolon from running into the next.
+                parts.append(minify_js(text).rstrip().rstrip(';') + ';')
+        content = '\n'.join(parts).encode('utf-8')
+        name = hashed_name(bundle, content)
+        write_asset(static_folder, name, content)
+        manifest[bundle] = name
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+#----------------------------------------------------------------------------#
+# Serving.
+#----------------------------------------------------------------------------#
+
+class Assets(object):
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.manifest = self.load_manifest(app.static_folder)
+        app.add_template_global(self.static_url)
+        app.add_template_global(self.bundle_urls)
+        app.view_functions['static'] = self.send_static
+
+    def load_manifest(self, static_folder):
+        try:
+            with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @property
+    def version(self):
+        # Changes with every build that changes an asset, so pages linking
+        # the old files are not revalidated as current.
+        return hashlib.sha1(json.dumps(self.manifest, sort_keys=True).encode()).hexdigest()
+
+    def built(self):
+        return bool(self.manifest) and not current_app.debug
+
+    def static_url(self, path):
+        if self.built() and path in self.manifest:
+            path = self.manifest[path]
+        return url_for('static', filename=path)
+
+    def bundle_urls(self, bundle):
+        if self.built() and bundle in self.manifest:
+            return [url_for('static', filename=self.manifest[bundle])]
+        return [url_for('static', filename=source) for source in BUNDLES[bundle]]
+
+    def send_static(self, filename):
+        if not filename.startswith(DIST + '/'):
+            return current_app.send_static_file(filename)
+
+        # Hashed files never change, so they are cached for a year and
+        # served precompressed when the client accepts it.
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if encoding in request.accept_encodings and \
+                    os.path.isfile(os.path.join(current_app.static_folder, filename + suffix)):
+                response = send_from_directory(current_app.static_folder, filename + suffix, mimetype=mimetype)
+                response.content_encoding = encoding
+                break
+        else:
+            response = send_from_directory(current_app.static_folder, filename, mimetype=mimetype)
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+
+assets = Assets()
+
+
+@click.group('assets')
+def assets_command():
+    """Build the static asset bundles."""
+
+
+@assets_command.command('build')
+@with_appcontext
+def build_command():
+    """Fingerprint, bundle, minify and precompress static/ into static/dist/."""
+    started = time.perf_counter()
+    manifest = build(current_app.static_folder, current_app.static_url_path)
+    assets.manifest = manifest
+    for bundle in BUNDLES:
+        path = os.path.join(current_app.static_folder, manifest[bundle])
+        click.echo('{} -> {} ({} bytes)'.format(bundle, manifest[bundle], os.path.getsize(path)))
+    click.echo('Built {} files in {:.0f}ms'.format(len(manifest), (time.perf_counter() - started) * 1000))
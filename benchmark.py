@@ -0,0 +1,700 @@
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, text
+from werkzeug.serving import WSGIRequestHandler, make_server
+from models import db, Venue, Artist, Show, Genre, venue_genre
+from cache import page_cache
+from search import search_by_name, has_search_vector
+from seed import Popularity, GENRES, ADJECTIVES, VENUE_NOUNS, ARTIST_NOUNS, fake_venue, fake_artist
+
+#----------------------------------------------------------------------------#
+# Benchmarks.
+#
+# `flask bench run` requests every route of the app against the current
+# database (fill one with `flask seed`), first one request at a time
+# through the Flask test client, then from --concurrency threads over HTTP
+# against a local threaded server (or --url). For each route it reports
+# requests per second, p50/p95/p99 latency and the SQL query count, read
+# from the Server-Timing header that SQL_INSTRUMENTATION adds. Results are
+# saved as JSON; `flask bench compare OLD NEW` lists the routes whose p95
+# latency or query count went up.
+#
+# `flask bench load` sends a random mix of the read routes from --clients
+# (200) concurrent connections, to check that the connection pool settings
+# hold up under that load.
+#
+# `flask bench search` times the name search itself, per SEARCH_MODE, with
+# and without the indexes that serve it, on names like the ones `flask
+# seed` generates (seed e.g. 1M venues and artists to see the difference).
+# `flask bench datetime` times the template's datetime filter on datetime
+# objects and on the ISO strings it used to be given.
+#----------------------------------------------------------------------------#
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+BENCHMARK_NAME = 'Benchmark'
+# Routes held to --max-p99-ms.
+TARGET_ROUTES = 'calendar'
+
+
+class Route(object):
+    # `path` and `data` are templates filled from the fixtures, or
+    # functions of (fixtures, rng) for values that change per request.
+
+    def __init__(self, name, endpoint, method, path, data=None, write=False):
+        self.name = name
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.data = data
+        self.write = write
+
+    def pick(self, rng):
+        return self
+
+    def request(self, fixtures, rng):
+        if callable(self.path):
+            path = self.path(fixtures, rng)
+        else:
+            path = self.path.format(**fixtures.values)
+        if callable(self.data):
+            data = self.data(fixtures, rng)
+        elif self.data is not None:
+            data = {key: value.format(**fixtures.values) for key, value in self.data.items()}
+        else:
+            data = None
+        return path, data
+
+
+class RouteMix(object):
+    # Each request goes to one of `routes`, picked at random.
+
+    def __init__(self, name, routes):
+        self.name = name
+        self.routes = routes
+
+    def pick(self, rng):
+        return rng.choice(self.routes)
+
+
+def new_venue(fixtures, rng):
+    data = fake_venue(rng, rng.randrange(10 ** 6), fixtures.city, fixtures.genres)
+    data['name'] = '{} {}'.format(BENCHMARK_NAME, data['name'])
+    return data
+
+
+def new_artist(fixtures, rng):
+    data = fake_artist(rng, rng.randrange(10 ** 6), fixtures.city, fixtures.genres)
+    data['name'] = '{} {}'.format(BENCHMARK_NAME, data['name'])
+    return data
+
+
+def new_show(fixtures, rng):
+    # Booked for the venue and artist the edit routes use (the delete
+    # route leaves that venue), far enough ahead to stay off the calendar.
+    start_time = datetime(2100, 1, 1) + timedelta(hours=4 * rng.randrange(10 ** 6))
+    return {
+        'venue_id': str(fixtures.created(Venue)[-1]),
+        'artist_id': str(fixtures.created(Artist)[-1]),
+        'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def created_venue_edit(fixtures, rng):
+    return '/venues/{}/edit'.format(fixtures.created(Venue)[-1])
+
+
+def created_artist_edit(fixtures, rng):
+    return '/artists/{}/edit'.format(fixtures.created(Artist)[-1])
+
+
+def created_venue_delete(fixtures, rng):
+    created = fixtures.created(Venue)
+    return '/venues/{}'.format(created.pop(0) if len(created) > 1 else 0)
+
+
+ROUTES = [
+    Route('home', 'index', 'GET', '/'),
+    Route('venues', 'venues', 'GET', '/venues'),
+    Route('venues_by_genre', 'venues', 'GET', '/venues?genre={genre}'),
+    Route('search_venues', 'search_venues', 'POST', '/venues/search', {'search_term': '{venue_term}'}),
+    Route('venue_busiest', 'show_venue', 'GET', '/venues/{busy_venue}'),
+    Route('venue_typical', 'show_venue', 'GET', '/venues/{typical_venue}'),
+    Route('venue_create_form', 'create_venue_form', 'GET', '/venues/create'),
+    Route('venue_edit_form', 'edit_venue', 'GET', '/venues/{busy_venue}/edit'),
+    Route('artists', 'artists', 'GET', '/artists'),
+    Route('artists_by_genre', 'artists', 'GET', '/artists?genre={genre}'),
+    Route('search_artists', 'search_artists', 'POST', '/artists/search', {'search_term': '{artist_term}'}),
+    Route('artist_busiest', 'show_artist', 'GET', '/artists/{busy_artist}'),
+    Route('artist_typical', 'show_artist', 'GET', '/artists/{typical_artist}'),
+    Route('artist_create_form', 'create_artist_form', 'GET', '/artists/create'),
+    Route('artist_edit_form', 'edit_artist', 'GET', '/artists/{busy_artist}/edit'),
+    Route('shows', 'shows', 'GET', '/shows'),
+    Route('calendar_week', 'shows', 'GET', '/shows?from={today}'),
+    Route('calendar_month_city', 'shows', 'GET', '/shows?from={today}&to={month}&{city_query}'),
+    Route('calendar_month_genre_json', 'shows', 'GET', '/shows?from={today}&to={month}&genre={genre}&format=json'),
+    Route('show_create_form', 'create_shows', 'GET', '/shows/create'),
+    Route('api_venues', 'api.venues', 'GET', '/api/v1/venues'),
+    Route('api_venue', 'api.venue', 'GET', '/api/v1/venues/{busy_venue}'),
+    Route('api_artists', 'api.artists', 'GET', '/api/v1/artists'),
+    Route('api_artist', 'api.artist', 'GET', '/api/v1/artists/{busy_artist}'),
+    Route('api_shows', 'api.shows', 'GET', '/api/v1/shows'),
+    Route('api_export_venues', 'api.export', 'GET', '/api/v1/export/venues.csv'),
+    Route('cache_stats', 'cache_stats', 'GET', '/cache/stats'),
+    Route('metrics', 'metrics', 'GET', '/metrics'),
+    Route('static', 'static', 'GET', '/static/css/main.css'),
+    Route('venue_create', 'create_venue_submission', 'POST', '/venues/create', new_venue, write=True),
+    Route('venue_edit', 'edit_venue_submission', 'POST', created_venue_edit, new_venue, write=True),
+    Route('artist_create', 'create_artist_submission', 'POST', '/artists/create', new_artist, write=True),
+    Route('artist_edit', 'edit_artist_submission', 'POST', created_artist_edit, new_artist, write=True),
+    Route('show_create', 'create_show_submission', 'POST', '/shows/create', new_show, write=True),
+    Route('venue_delete', 'delete_venue', 'DELETE', created_venue_delete, write=True),
+]
+
+
+class Fixtures(object):
+    # Ids and filter values the routes are requested with, picked from the
+    # database: the venue and artist with the most shows and a median one,
+    # the city and genre with the most venues, and a word of the busiest
+    # venue's and artist's names to search for.
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.created_ids = {}
+        busy_venue, typical_venue = self.busiest_and_median(Venue)
+        busy_artist, typical_artist = self.busiest_and_median(Artist)
+        city = db.session.query(Venue.city, Venue.state).group_by(Venue.city, Venue.state).order_by(
+            func.count(Venue.id).desc(), Venue.city
+        ).first() or ('', '')
+        genre = db.session.query(Genre.name).join(venue_genre, venue_genre.c.genre_id == Genre.id).group_by(
+            Genre.name
+        ).order_by(func.count().desc(), Genre.name).first()
+        today = datetime.utcnow().date()
+
+        self.city = tuple(city)
+        self.genres = Popularity(random.Random(0), GENRES, 1.1)
+        self.values = {
+            'busy_venue': busy_venue,
+            'typical_venue': typical_venue,
+            'busy_artist': busy_artist,
+            'typical_artist': typical_artist,
+            'venue_term': self.search_term(Venue, busy_venue),
+            'artist_term': self.search_term(Artist, busy_artist),
+            'city_query': urlencode({'city': city[0], 'state': city[1]}),
+            'genre': genre[0] if genre else GENRES[0],
+            'today': today.isoformat(),
+            'month': (today + timedelta(days=30)).isoformat(),
+        }
+
+    def busiest_and_median(self, model):
+        shows = model.upcoming_show_count + model.past_show_count
+        ids = [row.id for row in db.session.query(model.id).order_by(shows.desc(), model.id)]
+        if not ids:
+            return 0, 0
+        return ids[0], ids[len(ids) // 2]
+
+    def search_term(self, model, object_id):
+        name = db.session.query(model.name).filter(model.id == object_id).scalar() or ''
+        return max(name.split(), key=len, default='')
+
+    def created(self, model):
+        # Ids of the rows the write routes created, oldest first. Looked up
+        # once per mode, from whichever thread asks first.
+        with self.lock:
+            if model not in self.created_ids:
+                with self.app.app_context():
+                    self.created_ids[model] = [row.id for row in db.session.query(model.id).filter(
+                        model.name.like(BENCHMARK_NAME + ' %')
+                    ).order_by(model.id)] or [0]
+            return self.created_ids[model]
+
+
+#  Measurement
+#  ----------------------------------------------------------------
+
+def query_count(headers):
+    match = SERVER_TIMING_QUERIES.search(headers.get('Server-Timing') or '')
+    return int(match.group(1)) if match else None
+
+
+def percentile(ordered, fraction):
+    # Nearest-rank percentile of an ascending list.
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(samples, elapsed):
+    # `samples` are (seconds, status, query count) tuples.
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    queries = [sample[2] for sample in samples if sample[2] is not None]
+    return {
+        'requests': len(samples),
+        'rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(statistics.mean(latencies), 2),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'max_ms': round(latencies[-1], 2),
+        'queries': statistics.median(queries) if queries else None,
+        'statuses': {str(status): count for status, count in sorted(Counter(sample[1] for sample in samples).items())},
+    }
+
+
+def run_client(route, fixtures, requests, warmup, seed):
+    # One request at a time through the test client; throughput is the
+    # inverse of the mean latency.
+    client = current_app.test_client()
+    rng = random.Random(seed)
+    samples = []
+    for number in range(warmup + requests):
+        path, data = route.request(fixtures, rng)
+        started = time.perf_counter()
+        response = client.open(path, method=route.method, data=data)
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        if number >= warmup:
+            samples.append((elapsed, response.status_code, query_count(response.headers)))
+        response.close()
+    return summarize(samples, sum(sample[0] for sample in samples))
+
+
+def run_http(route, fixtures, url, requests, warmup, concurrency, seed):
+    # `concurrency` threads, each on its own keep-alive connection, share
+    # the requests; throughput is requests over wall-clock time.
+    parts = urlsplit(url)
+    samples = []
+    remaining = [warmup + requests]
+    lock = threading.Lock()
+
+    def worker(number):
+        rng = random.Random(seed * 1000 + number)
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+        while True:
+            with lock:
+                if not remaining[0]:
+                    break
+                remaining[0] -= 1
+                measured = remaining[0] < requests
+            picked = route.pick(rng)
+            path, data = picked.request(fixtures, rng)
+            body = urlencode(data, doseq=True) if data else None
+            headers = {'Accept-Encoding': 'gzip, br'}
+            if body:
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            started = time.perf_counter()
+            try:
+                connection.request(picked.method, parts.path.rstrip('/') + path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+                queries = query_count(response.headers)
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                status, queries = 0, None
+            elapsed = time.perf_counter() - started
+            if measured:
+                with lock:
+                    samples.append((elapsed, status, queries))
+        connection.close()
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # The warmup requests are a small share of the wall time and are not
+    # taken out of it, which slightly understates throughput.
+    return summarize(samples, time.perf_counter() - started)
+
+
+def search_terms(model):
+    # Whole words, word prefixes, two-word phrases and a term that matches
+    # nothing, drawn from the words generated names are made of.
+    nouns = VENUE_NOUNS if model is Venue else ARTIST_NOUNS
+    terms = []
+    for adjective, noun in zip(ADJECTIVES, nouns * 2):
+        terms.extend([adjective, noun[:3].lower(), '{} {}'.format(adjective, noun)])
+    terms.append('xyzzy')
+    return terms
+
+
+def run_search(model, mode, indexed, requests, warmup):
+    # One search_by_name call (count and first page) per sample, each in
+    # its own transaction. Without indexes the planner is told not to use
+    # index or bitmap scans, leaving a sequential scan of the table.
+    terms = search_terms(model)
+    saved = current_app.config.get('SEARCH_MODE', 'trigram')
+    current_app.config['SEARCH_MODE'] = mode
+    samples = []
+    try:
+        for number in range(warmup + requests):
+            if not indexed:
+                db.session.execute(text('SET LOCAL enable_indexscan = off'))
+                db.session.execute(text('SET LOCAL enable_bitmapscan = off'))
+            started = time.perf_counter()
+            search_by_name(model, terms[number % len(terms)], limit=10)
+            elapsed = time.perf_counter() - started
+            db.session.rollback()
+            if number >= warmup:
+                samples.append((elapsed, 200, 2))
+    finally:
+        current_app.config['SEARCH_MODE'] = saved
+        db.session.rollback()
+    return summarize(samples, sum(sample[0] for sample in samples))
+
+
+def run_filter(function, values, repeat, format):
+    # Each sample is one pass over all `values`.
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for value in values:
+            function(value, format)
+        samples.append((time.perf_counter() - started, 200, None))
+    return summarize(samples, sum(sample[0] for sample in samples))
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class LocalServer(object):
+    # The app on a threaded Werkzeug server on a free local port.
+
+    def __init__(self, app):
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self.url
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.thread.join()
+
+
+class PoolSampler(object):
+    # Samples the local app's connection pool while a run is going.
+
+    def __init__(self, engine, interval=0.01):
+        self.pool = engine.pool
+        self.interval = interval
+        self.peak_checked_out = 0
+        self.peak_overflow = 0
+        self.running = False
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        while self.running:
+            self.peak_checked_out = max(self.peak_checked_out, self.pool.checkedout())
+            self.peak_overflow = max(self.peak_overflow, self.pool.overflow())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        if hasattr(self.pool, 'overflow'):
+            self.running = True
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.running:
+            self.running = False
+            self.thread.join()
+
+    def values(self):
+        if not hasattr(self.pool, 'overflow'):
+            return None
+        return {
+            'size': self.pool.size(),
+            'peak_checked_out': self.peak_checked_out,
+            'peak_overflow': self.peak_overflow,
+        }
+
+
+def format_result(name, result):
+    return '{:<28} {:>8} req/s  p50 {:>8.1f}ms  p95 {:>8.1f}ms  p99 {:>8.1f}ms  {:>5} queries  {}'.format(
+        name, result['rps'] if result['rps'] is not None else '-', result['p50_ms'], result['p95_ms'],
+        result['p99_ms'], result['queries'] if result['queries'] is not None else '-',
+        ' '.join('{}x{}'.format(count, status) for status, count in result['statuses'].items())
+    )
+
+
+def over_target(results, max_p99_ms):
+    # The calendar routes whose p99 is above the absolute target.
+    return [
+        '{} ({}, p99 {:.1f}ms)'.format(name, mode, result['p99_ms'])
+        for mode, routes in results.items() for name, result in routes.items()
+        if name.startswith(TARGET_ROUTES) and result['p99_ms'] > max_p99_ms
+    ]
+
+
+def make_report(app, options, results):
+    return {
+        'started': datetime.utcnow().isoformat(timespec='seconds'),
+        'release': app.config.get('RELEASE', ''),
+        'python': platform.python_version(),
+        'database': db.engine.dialect.name,
+        'rows': {
+            'venues': db.session.query(func.count(Venue.id)).scalar(),
+            'artists': db.session.query(func.count(Artist.id)).scalar(),
+            'shows': db.session.query(func.count(Show.id)).scalar(),
+        },
+        'options': options,
+        'results': results,
+    }
+
+
+def save_report(report, output):
+    output = output or os.path.join('benchmarks', '{:%Y%m%d-%H%M%S}.json'.format(datetime.now()))
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    click.echo('Saved {}'.format(output))
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@click.group('bench')
+def bench_command():
+    """Benchmark the app's routes."""
+
+
+@bench_command.command('run')
+@click.option('--mode', type=click.Choice(['client', 'http', 'both']), default='both', show_default=True)
+@click.option('--requests', 'request_count', default=200, show_default=True, help='Measured requests per route and mode.')
+@click.option('--warmup', default=10, show_default=True, help='Unmeasured requests per route before measuring.')
+@click.option('--concurrency', default=8, show_default=True, help='HTTP client threads.')
+@click.option('--url', help='Benchmark a running server instead of a local one (HTTP mode, read routes only).')
+@click.option('--routes', 'route_filter', help='Comma-separated substrings; only matching route names run.')
+@click.option('--writes', is_flag=True, help='Also run the routes that create, edit and delete rows.')
+@click.option('--cache/--no-cache', default=False, show_default=True, help='Serve cached pages from the page cache.')
+@click.option('--seed', 'seed_value', default=1, show_default=True, help='Random seed for generated form data.')
+@click.option('--output', type=click.Path(dir_okay=False),
+              help='Where to save the results; defaults to benchmarks/<timestamp>.json.')
+@click.option('--max-p99-ms', type=float, help='Fail when a calendar route\'s p99 is above this many ms.')
+@with_appcontext
+def run_command(mode, request_count, warmup, concurrency, url, route_filter, writes, cache, seed_value, output,
+                max_p99_ms):
+    """Measure throughput, latency percentiles and query counts per route."""
+    app = current_app._get_current_object()
+    modes = ['client', 'http'] if mode == 'both' else [mode]
+    if url:
+        modes = ['http']
+        writes = False
+    routes = [route for route in ROUTES if writes or not route.write]
+    if route_filter:
+        patterns = [pattern.strip() for pattern in route_filter.split(',') if pattern.strip()]
+        routes = [route for route in routes if any(pattern in route.name for pattern in patterns)]
+    else:
+        covered = {route.endpoint for route in ROUTES}
+        missing = sorted(endpoint for endpoint in app.view_functions if endpoint not in covered)
+        if missing:
+            click.echo('Not benchmarked: {}'.format(', '.join(missing)))
+
+    if not url and not app.config.get('SQL_INSTRUMENTATION'):
+        click.echo('SQL_INSTRUMENTATION is off, so query counts are not reported.')
+    saved = (page_cache.enabled, app.config.get('WTF_CSRF_ENABLED', True))
+    page_cache.enabled = cache
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    fixtures = Fixtures(app)
+    db.session.remove()
+    results = {}
+    failed = []
+    try:
+        for current in modes:
+            click.echo('{} mode'.format(current))
+            results[current] = {}
+            fixtures.created_ids.clear()
+            with (LocalServer(app) if current == 'http' and not url else nullcontext(url)) as base_url:
+                for route in routes:
+                    if current == 'client':
+                        result = run_client(route, fixtures, request_count, warmup, seed_value)
+                    else:
+                        result = run_http(route, fixtures, base_url, request_count, warmup, concurrency, seed_value)
+                    results[current][route.name] = result
+                    click.echo(format_result(route.name, result))
+                    if any(status == '0' or status.startswith('5') for status in result['statuses']):
+                        failed.append('{} ({})'.format(route.name, current))
+    finally:
+        page_cache.enabled, app.config['WTF_CSRF_ENABLED'] = saved
+        db.session.remove()
+
+    report = make_report(app, {
+        'requests': request_count, 'warmup': warmup, 'concurrency': concurrency, 'url': url,
+        'cache': cache, 'writes': writes, 'seed': seed_value,
+        'async_views': app.config.get('ASYNC_VIEWS', False),
+        'compress': app.config.get('COMPRESS_ENABLED', False),
+    }, results)
+    report['fixtures'] = fixtures.values
+    save_report(report, output)
+    if failed:
+        raise click.ClickException('Server errors in {}'.format(', '.join(failed)))
+    slow = over_target(results, max_p99_ms) if max_p99_ms is not None else []
+    if slow:
+        raise click.ClickException('Over the {:g}ms p99 target: {}'.format(max_p99_ms, ', '.join(slow)))
+
+
+@bench_command.command('load')
+@click.option('--clients', default=200, show_default=True, help='Concurrent HTTP clients.')
+@click.option('--requests', 'request_count', default=5000, show_default=True, help='Measured requests in total.')
+@click.option('--warmup', default=200, show_default=True, help='Unmeasured requests before measuring.')
+@click.option('--url', help='Load a running server instead of a local one.')
+@click.option('--seed', 'seed_value', default=1, show_default=True, help='Random seed for the route mix.')
+@click.option('--output', type=click.Path(dir_okay=False),
+              help='Where to save the results; defaults to benchmarks/<timestamp>.json.')
+@with_appcontext
+def load_command(clients, request_count, warmup, url, seed_value, output):
+    """Load every read route at once from many clients and check the pool keeps up."""
+    # A pool too small for the load shows up as requests waiting out
+    # DB_POOL_TIMEOUT and failing with 500s, or as p99 far above p50.
+    app = current_app._get_current_object()
+    mix = RouteMix('read mix', [route for route in ROUTES if not route.write])
+    saved = page_cache.enabled
+    page_cache.enabled = False
+    fixtures = Fixtures(app)
+    db.session.remove()
+    try:
+        with (LocalServer(app) if not url else nullcontext(url)) as base_url, PoolSampler(db.engine) as pool:
+            result = run_http(mix, fixtures, base_url, request_count, warmup, clients, seed_value)
+    finally:
+        page_cache.enabled = saved
+        db.session.remove()
+    click.echo(format_result(mix.name, result))
+
+    report = make_report(app, {
+        'clients': clients, 'requests': request_count, 'warmup': warmup, 'url': url, 'seed': seed_value,
+        'pool_size': app.config.get('DB_POOL_SIZE'), 'max_overflow': app.config.get('DB_MAX_OVERFLOW'),
+        'pgbouncer': app.config.get('DB_PGBOUNCER', False),
+    }, {'load': {mix.name: result}})
+    if not url and pool.values():
+        report['pool'] = pool.values()
+        click.echo('pool: size {size}, peak {peak_checked_out} checked out, peak overflow {peak_overflow}'.format(
+            **report['pool']
+        ))
+    report['fixtures'] = fixtures.values
+    save_report(report, output)
+    if any(status == '0' or status.startswith('5') for status in result['statuses']):
+        raise click.ClickException('Failed requests under load: {}'.format(result['statuses']))
+
+
+@bench_command.command('search')
+@click.option('--requests', 'request_count', default=100, show_default=True, help='Measured searches per scenario.')
+@click.option('--warmup', default=5, show_default=True, help='Unmeasured searches per scenario before measuring.')
+@click.option('--output', type=click.Path(dir_okay=False),
+              help='Where to save the results; defaults to benchmarks/<timestamp>.json.')
+@with_appcontext
+def search_command(request_count, warmup, output):
+    """Time venue and artist search per search mode, with and without indexes."""
+    app = current_app._get_current_object()
+    postgres = db.engine.dialect.name == 'postgresql'
+    if postgres:
+        scenarios = [(mode, indexed) for mode in ('trigram', 'fulltext') for indexed in (True, False)]
+    else:
+        # Other databases have one search, a plain LIKE scan with no index.
+        scenarios = [('like', True)]
+
+    results = {'search': {}}
+    for model in (Venue, Artist):
+        for mode, indexed in scenarios:
+            if mode == 'fulltext' and not has_search_vector(model):
+                click.echo('{}: no search_vector column, skipping fulltext'.format(model.__tablename__))
+                continue
+            name = '{} {}'.format(model.__tablename__, mode)
+            if postgres:
+                name += ' indexed' if indexed else ' unindexed'
+            result = run_search(model, mode, indexed, request_count, warmup)
+            results['search'][name] = result
+            click.echo(format_result(name, result))
+
+    save_report(make_report(app, {'requests': request_count, 'warmup': warmup}, results), output)
+
+
+@bench_command.command('datetime')
+@click.option('--values', 'value_count', default=10000, show_default=True, help='Values formatted per pass.')
+@click.option('--repeat', default=20, show_default=True, help='Measured passes per kind of value.')
+@click.option('--format', 'format_name', default='medium', show_default=True)
+@click.option('--seed', 'seed_value', default=1, show_default=True, help='Random seed for the generated values.')
+@click.option('--output', type=click.Path(dir_okay=False),
+              help='Where to save the results; defaults to benchmarks/<timestamp>.json.')
+@with_appcontext
+def datetime_command(value_count, repeat, format_name, seed_value, output):
+    """Time the datetime template filter on datetimes and on ISO strings."""
+    app = current_app._get_current_object()
+    format_datetime = app.jinja_env.filters['datetime']
+    rng = random.Random(seed_value)
+    start = datetime(2026, 1, 1)
+    datetimes = [start + timedelta(minutes=rng.randrange(525600)) for _ in range(value_count)]
+    kinds = [('datetime objects', datetimes), ('iso strings', [value.isoformat() for value in datetimes])]
+
+    # Parses the pattern into the per-format cache before anything is timed.
+    format_datetime(datetimes[0], format_name)
+    results = {'datetime': {}}
+    for name, values in kinds:
+        result = run_filter(format_datetime, values, repeat, format_name)
+        results['datetime'][name] = result
+        click.echo('{:<28} p50 {:>8.1f}ms  p95 {:>8.1f}ms per {} values  ({:.1f}us per value)'.format(
+            name, result['p50_ms'], result['p95_ms'], value_count, 1000 * result['p50_ms'] / value_count
+        ))
+
+    save_report(make_report(app, {
+        'values': value_count, 'repeat': repeat, 'format': format_name, 'seed': seed_value,
+    }, results), output)
+
+
+@bench_command.command('compare')
+@click.argument('baseline', type=click.File())
+@click.argument('current', type=click.File())
+@click.option('--threshold', default=10.0, show_default=True, help='Allowed p95 slowdown, in percent.')
+@click.option('--min-ms', default=1.0, show_default=True, help='p95 changes smaller than this are noise.')
+@click.option('--max-p99-ms', type=float, help='Also fail when a calendar route\'s p99 in CURRENT is above this.')
+def compare_command(baseline, current, threshold, min_ms, max_p99_ms):
+    """Compare two saved runs and fail on p95 or query count regressions."""
+    baseline = json.load(baseline)
+    current = json.load(current)
+    regressions = []
+    for mode, routes in current['results'].items():
+        for name, result in routes.items():
+            before = baseline['results'].get(mode, {}).get(name)
+            if before is None:
+                continue
+            change = result['p95_ms'] - before['p95_ms']
+            percent = 100.0 * change / before['p95_ms'] if before['p95_ms'] else 0.0
+            line = '{:<6} {:<28} p95 {:>8.1f}ms -> {:>8.1f}ms ({:+.0f}%)  queries {} -> {}'.format(
+                mode, name, before['p95_ms'], result['p95_ms'], percent, before['queries'], result['queries']
+            )
+            slower = percent > threshold and change > min_ms
+            more_queries = None not in (before['queries'], result['queries']) and result['queries'] > before['queries']
+            if slower or more_queries:
+                regressions.append(name)
+                line += '  REGRESSION'
+            click.echo(line)
+    if max_p99_ms is not None:
+        for route in over_target(current['results'], max_p99_ms):
+            click.echo('{} over the {:g}ms p99 target'.format(route, max_p99_ms))
+            regressions.append(route)
+    if regressions:
+        raise click.ClickException('{} regressions'.format(len(regressions)))
+    click.echo('No regressions')
@@ -0,0 +1,138 @@
+import heapq
+from datetime import timedelta
+from itertools import groupby
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, or_
+from models import db, Show
+
+#----------------------------------------------------------------------------#
+# Booking conflicts.
+#
+# Two shows conflict when they share a venue or an artist and their
+# [start_time, end_time) intervals overlap. On Postgres the show table has
+# exclusion constraints (a GiST index over tsrange(start_time, end_time))
+# that make a conflicting insert fail; find_conflicts runs first so the
+# form can say what a booking collides with, and is the only check on
+# other databases. On Postgres the overlap lookups use the same tsrange
+# expression, so the constraints' GiST indexes answer them; elsewhere they
+# scan the (venue_id/artist_id, start_time) indexes from at most
+# SHOW_MAX_DURATION_HOURS before the window.
+#
+# Reports sweep intervals in start order, keeping the ones still running
+# in a heap keyed by end time: O(n log n) plus the number of conflicts
+# found, instead of comparing every pair.
+#----------------------------------------------------------------------------#
+
+RESOURCES = (('venue', Show.venue_id), ('artist', Show.artist_id))
+
+
+def default_end(start_time):
+    return start_time + timedelta(minutes=current_app.config.get('SHOW_DEFAULT_DURATION_MINUTES', 120))
+
+
+def max_duration():
+    return timedelta(hours=current_app.config.get('SHOW_MAX_DURATION_HOURS', 24))
+
+
+def overlapping(start_time, end_time):
+    # Filters for the shows overlapping [start_time, end_time).
+    if db.engine.dialect.name == 'postgresql':
+        return (
+            Show.start_time.isnot(None),
+            func.tsrange(Show.start_time, Show.end_time).op('&&')(func.tsrange(start_time, end_time)),
+        )
+    # No show runs longer than max_duration(), so one starting earlier than
+    # that before the window has ended by its start.
+    return (
+        Show.start_time > start_time - max_duration(),
+        Show.start_time < end_time,
+        Show.end_time > start_time,
+    )
+
+
+def find_conflicts(venue_id, artist_id, start_time, end_time):
+    # Shows of the venue or the artist overlapping [start_time, end_time).
+    return Show.query.filter(
+        or_(Show.venue_id == venue_id, Show.artist_id == artist_id),
+        *overlapping(start_time, end_time)
+    ).order_by(Show.start_time).all()
+
+
+def sweep(intervals):
+    # Yields every overlapping pair of (start, end, item) intervals, the
+    # earlier-starting item first.
+    active = []
+    for number, (start, end, item) in enumerate(sorted(intervals, key=lambda interval: interval[:2])):
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for _, _, other in active:
+            yield other, item
+        heapq.heappush(active, (end, number, item))
+
+
+def batch_conflicts(rows):
+    # Indexes of the rows (dicts with venue_id, artist_id, start_time and
+    # end_time) that conflict with an existing show or with an earlier
+    # row of the batch. Existing shows are read in one query covering the
+    # batch's time span.
+    rows = {index: row for index, row in enumerate(rows) if row['start_time'] is not None}
+    if not rows:
+        return set()
+    existing = db.session.query(Show.venue_id, Show.artist_id, Show.start_time, Show.end_time).filter(
+        or_(
+            Show.venue_id.in_({row['venue_id'] for row in rows.values()}),
+            Show.artist_id.in_({row['artist_id'] for row in rows.values()})
+        ),
+        *overlapping(
+            min(row['start_time'] for row in rows.values()),
+            max(row['end_time'] for row in rows.values())
+        )
+    ).all()
+
+    rejected = set()
+    for resource, column in RESOURCES:
+        key = column.key
+        shows = {}
+        for show in existing:
+            shows.setdefault(getattr(show, key), []).append((show.start_time, show.end_time, None))
+        for index, row in rows.items():
+            shows.setdefault(row[key], []).append((row['start_time'], row['end_time'], index))
+        for intervals in shows.values():
+            for first, second in sweep(intervals):
+                if second is not None and (first is None or first not in rejected):
+                    rejected.add(second)
+                elif first is not None and second is None:
+                    rejected.add(first)
+    return rejected
+
+
+def conflicts_report():
+    # Yields (resource, resource id, show id, show id) for every conflict,
+    # reading the shows in index order one venue or artist at a time.
+    for resource, column in RESOURCES:
+        query = db.session.query(column, Show.id, Show.start_time, Show.end_time).filter(
+            Show.start_time.isnot(None)
+        ).order_by(column, Show.start_time, Show.id)
+        for key, rows in groupby(query.yield_per(1000), key=lambda row: row[0]):
+            for first, second in sweep((row.start_time, row.end_time, row.id) for row in rows):
+                yield resource, key, first, second
+
+
+@click.group('shows')
+def shows_command():
+    """Show booking tools."""
+
+
+@shows_command.command('conflicts')
+@with_appcontext
+def conflicts_command():
+    """List every pair of overlapping shows at the same venue or with the same artist."""
+    count = 0
+    for resource, key, first, second in conflicts_report():
+        click.echo('{} {}: show {} overlaps show {}'.format(resource, key, first, second))
+        count += 1
+    if count:
+        raise click.ClickException('{} conflicts found'.format(count))
+    click.echo('No conflicts')
@@ -0,0 +1,362 @@
+import csv
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, text
+from werkzeug.datastructures import MultiDict
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, Genre, venue_genre, artist_genre, mark_written
+from rollups import count_shows
+from bookings import default_end, batch_conflicts
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#
+# Rows are streamed from CSV or JSONL, validated with the same forms the web
+# handlers use and written in batches: COPY on Postgres, executemany
+# elsewhere. Each batch is committed on its own; a batch that fails to
+# write is rolled back and all of its rows go to the rejects file.
+#----------------------------------------------------------------------------#
+
+IMPORTS = {
+    # kind: (form, model, genre association table, association key)
+    'venues': (VenueForm, Venue, venue_genre, 'venue_id'),
+    'artists': (ArtistForm, Artist, artist_genre, 'artist_id'),
+    'shows': (ShowForm, Show, None, None),
+}
+
+# Form fields whose column has a different name.
+FIELD_COLUMNS = {'website_link': 'website'}
+
+# Maintained by the app, not part of an import or export.
+DERIVED_COLUMNS = ('updated_at', 'upcoming_show_count', 'past_show_count')
+
+COPY_NULL = '\\N'
+
+
+def read_rows(path, format):
+    with open(path, newline='') as f:
+        if format == 'csv':
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def batches(rows, size):
+    batch = []
+    for number, row in enumerate(rows, 1):
+        batch.append((number, row))
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def form_data(row):
+    # CSV gives genres as one comma-separated cell and JSONL as a list;
+    # booleans from JSONL become the checkbox values the forms expect.
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None or value is False:
+            continue
+        if value is True:
+            value = 'y'
+        if key == 'genres' and isinstance(value, str):
+            value = [genre.strip() for genre in value.split(',') if genre.strip()]
+        if isinstance(value, list):
+            for item in value:
+                data.add(key, str(item))
+        else:
+            data.add(key, str(value))
+    return data
+
+
+def validate_row(form_class, model, row):
+    # Returns (column values, genre names) or raises ValueError with the
+    # form's errors.
+    if model is Show and not row.get('start_time'):
+        # ShowForm would fill in its default, the time forms.py was loaded.
+        raise ValueError({'start_time': ['This field is required.']})
+    form = form_class(formdata=form_data(row), meta={'csrf': False})
+    if not form.validate():
+        raise ValueError(form.errors)
+    values = {}
+    genres = []
+    for field in form:
+        if field.name == 'genres':
+            genres = field.data
+            continue
+        column = FIELD_COLUMNS.get(field.name, field.name)
+        if hasattr(model, column):
+            values[column] = field.data
+    if model is Show:
+        values['artist_id'] = int(values['artist_id'])
+        values['venue_id'] = int(values['venue_id'])
+        values['end_time'] = values['end_time'] or default_end(values['start_time'])
+    return values, genres
+
+
+def missing_references(rows):
+    # {index: error} for the show rows whose venue or artist does not
+    # exist, with one IN lookup per table for the batch.
+    errors = {}
+    for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+        ids = {row[key] for row in rows}
+        found = {row.id for row in db.session.query(model.id).filter(model.id.in_(ids))}
+        for index, row in enumerate(rows):
+            if row[key] not in found:
+                errors.setdefault(index, 'unknown {} {}'.format(key, row[key]))
+    return errors
+
+
+def drop_rejected(batch, valid, numbers, errors, rejects):
+    # Writes the rows at the `errors` indexes of `valid` to `rejects` and
+    # returns the remaining (valid, numbers).
+    rows = dict(batch)
+    for index in sorted(errors):
+        number = numbers[index]
+        rejects.write(json.dumps({'row': number, 'data': rows[number], 'errors': errors[index]}) + '\n')
+    return (
+        [item for index, item in enumerate(valid) if index not in errors],
+        [number for index, number in enumerate(numbers) if index not in errors]
+    )
+
+
+def reserve_ids(model, count):
+    # Ids are assigned up front so genre associations can be written in the
+    # same batch without reading the rows back.
+    if db.engine.dialect.name == 'postgresql':
+        return [row[0] for row in db.session.execute(
+            text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+            {'table': model.__tablename__, 'count': count}
+        )]
+    start = (db.session.query(func.max(model.id)).scalar() or 0) + 1
+    return list(range(start, start + count))
+
+
+def genre_ids(names, known):
+    missing = [name for name in dict.fromkeys(names) if name not in known]
+    if missing:
+        genres = Genre.from_names(missing)
+        db.session.add_all(genres)
+        db.session.flush()
+        known.update((genre.name, genre.id) for genre in genres)
+    return [known[name] for name in names]
+
+
+def copy_rows(table, rows):
+    # csv.writer writes None and '' alike, and COPY would read both as
+    # NULL; None is sent as \N instead so empty strings stay empty, as
+    # they do through executemany.
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([COPY_NULL if row[column] is None else row[column] for column in columns])
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        'COPY "{}" ({}) FROM STDIN WITH (FORMAT csv, NULL \'{}\')'.format(
+            table.name, ', '.join('"{}"'.format(column) for column in columns), COPY_NULL
+        ),
+        buffer
+    )
+
+
+def insert_rows(table, rows):
+    if not rows:
+        return
+    if db.engine.dialect.name == 'postgresql':
+        copy_rows(table, rows)
+    else:
+        db.session.execute(table.insert(), rows)
+
+
+def write_batch(model, association, key, valid, known_genres):
+    now = datetime.utcnow()
+    ids = reserve_ids(model, len(valid))
+    rows = []
+    links = []
+    for object_id, (values, genres) in zip(ids, valid):
+        rows.append(dict(values, id=object_id, updated_at=now))
+        if association is not None:
+            links.extend(
+                {key: object_id, 'genre_id': genre_id}
+                for genre_id in genre_ids(genres, known_genres)
+            )
+    insert_rows(model.__table__, rows)
+    if association is not None:
+        insert_rows(association, links)
+    mark_written(db.session, [model.__tablename__])
+    if model is Show:
+        count_shows(db.session.connection(), [
+            (row['venue_id'], row['artist_id'], row['start_time'], 1) for row in rows
+        ])
+    return rows
+
+
+def import_rows(kind, rows, batch_size, rejects):
+    # Imports `rows` and returns (imported, rejected); rejected rows are
+    # written to the `rejects` file object as JSON lines.
+    form_class, model, association, key = IMPORTS[kind]
+    known_genres = dict(db.session.query(Genre.name, Genre.id))
+    imported = rejected = 0
+    started = time.monotonic()
+
+    for batch in batches(rows, batch_size):
+        valid = []
+        numbers = []
+        for number, row in batch:
+            try:
+                valid.append(validate_row(form_class, model, row))
+                numbers.append(number)
+            except ValueError as error:
+                rejects.write(json.dumps({'row': number, 'data': row, 'errors': str(error)}) + '\n')
+                rejected += 1
+        if model is Show:
+            # Shows naming a missing venue or artist, or overlapping an
+            # existing booking or an earlier row of the batch, are rejected
+            # rather than failing the whole batch.
+            errors = missing_references([values for values, _ in valid])
+            valid, numbers = drop_rejected(batch, valid, numbers, errors, rejects)
+            rejected += len(errors)
+            clashes = batch_conflicts([values for values, _ in valid])
+            errors = {index: 'overlaps another show' for index in clashes}
+            valid, numbers = drop_rejected(batch, valid, numbers, errors, rejects)
+            rejected += len(errors)
+        if not valid:
+            continue
+
+        try:
+            written = write_batch(model, association, key, valid, known_genres)
+            db.session.commit()
+        except Exception as error:
+            db.session.rollback()
+            known_genres = dict(db.session.query(Genre.name, Genre.id))
+            for number, row in batch:
+                if number in numbers:
+                    rejects.write(json.dumps({'row': number, 'data': row, 'errors': str(error)}) + '\n')
+            rejected += len(valid)
+            continue
+
+        imported += len(written)
+        elapsed = time.monotonic() - started
+        click.echo('{}: {} imported, {} rejected ({:.0f} rows/sec)'.format(
+            kind, imported, rejected, (imported + rejected) / elapsed if elapsed else 0
+        ))
+
+    return imported, rejected
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(['csv', 'jsonl']),
+              help='Input format; defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--rejects', 'rejects_path', type=click.Path(dir_okay=False),
+              help='Where to write rejected rows; defaults to PATH.rejects.jsonl.')
+@with_appcontext
+def import_command(kind, path, format, batch_size, rejects_path):
+    """Bulk import venues, artists or shows from a CSV or JSONL file."""
+    format = format or ('jsonl' if os.path.splitext(path)[1] in ('.jsonl', '.json') else 'csv')
+    rejects_path = rejects_path or path + '.rejects.jsonl'
+    started = time.monotonic()
+    with open(rejects_path, 'w') as rejects:
+        imported, rejected = import_rows(kind, read_rows(path, format), batch_size, rejects)
+
+    elapsed = time.monotonic() - started
+    click.echo('Imported {} {} in {:.1f}s ({:.0f} rows/sec); {} rejected -> {}'.format(
+        imported, kind, elapsed, (imported + rejected) / elapsed if elapsed else 0,
+        rejected, rejects_path
+    ))
+
+
+#----------------------------------------------------------------------------#
+# Bulk export.
+#
+# Each export is one query (shows are joined to their artist and venue
+# names) read through a server-side cursor, and serialized in chunks, so
+# memory stays constant however large the catalogue is.
+#----------------------------------------------------------------------------#
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+EXPORT_CHUNK_ROWS = 500
+
+
+def export_query(kind):
+    if kind == 'shows':
+        return db.session.query(
+            Show.id,
+            Show.start_time,
+            Show.end_time,
+            Show.venue_id,
+            Venue.name.label('venue_name'),
+            Show.artist_id,
+            Artist.name.label('artist_name')
+        ).join(Venue, Show.venue_id == Venue.id).join(
+            Artist, Show.artist_id == Artist.id
+        ).order_by(Show.id)
+
+    _, model, association, key = IMPORTS[kind]
+    if db.engine.dialect.name == 'postgresql':
+        genres = func.string_agg(Genre.name, ',')
+    else:
+        genres = func.group_concat(Genre.name, ',')
+    columns = [column for column in model.__table__.columns if column.name not in DERIVED_COLUMNS]
+    return db.session.query(*columns, genres.label('genres')).outerjoin(
+        association, association.c[key] == model.id
+    ).outerjoin(Genre, Genre.id == association.c.genre_id).group_by(
+        model.id
+    ).order_by(model.id)
+
+
+def export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_chunks(kind, format):
+    # Yields the export as text chunks of EXPORT_CHUNK_ROWS rows each.
+    query = export_query(kind)
+    fields = [column['name'] for column in query.column_descriptions]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == 'csv':
+        writer.writerow(fields)
+
+    for number, row in enumerate(query.yield_per(EXPORT_CHUNK_ROWS), 1):
+        values = [export_value(value) for value in row]
+        if format == 'csv':
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(fields, values))) + '\n')
+        if number % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.option('--format', 'format', type=click.Choice(EXPORT_FORMATS), default='jsonl', show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), help='Defaults to standard output.')
+@with_appcontext
+def export_command(kind, format, output):
+    """Stream all venues, artists or shows to CSV or JSONL."""
+    out = open(output, 'w', newline='') if output else sys.stdout
+    try:
+        for chunk in export_chunks(kind, format):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
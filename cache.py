@@ -0,0 +1,192 @@
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import g, request, session, make_response, Response
+from database import pinned_to_primary
+
+logger = logging.getLogger(__name__)
+
+#----------------------------------------------------------------------------#
+# Backends.
+#
+# A backend stores rendered pages under a key (path + query string) and
+# remembers which keys belong to which path, so that a write can drop
+# every cached variant of a page (e.g. all keyset pages of /shows) without
+# touching unrelated pages.
+#----------------------------------------------------------------------------#
+
+class LRUBackend(object):
+    # In-process LRU with per-entry TTL. Each worker process has its own
+    # copy, so invalidation only reaches the process that handled the write;
+    # other workers miss on the page's new version and let the old entry
+    # age out.
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.paths = {}
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, path, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires, _ = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, path, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + timeout, path)
+            self.entries.move_to_end(key)
+            self.paths.setdefault(path, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def delete_path(self, path):
+        with self.lock:
+            for key in self.paths.pop(path, ()):
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.paths.clear()
+
+    def _remove(self, key):
+        path = self.entries.pop(key)[2]
+        keys = self.paths[path]
+        keys.discard(key)
+        if not keys:
+            del self.paths[path]
+
+
+class RedisBackend(object):
+    # Shared backend: every worker sees the same entries and invalidations.
+    # Redis enforces TTLs and does its own eviction (maxmemory-policy).
+
+    prefix = 'fyyur:cache:'
+    evictions = 0
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, path, key):
+        value = self.client.get(self.prefix + 'page:' + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, path, key, value, timeout):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + 'page:' + key, pickle.dumps(value), ex=int(timeout))
+        pipe.sadd(self.prefix + 'path:' + path, key)
+        pipe.execute()
+
+    def delete_path(self, path):
+        keys = self.client.smembers(self.prefix + 'path:' + path)
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.delete(self.prefix + 'page:' + key.decode())
+        pipe.delete(self.prefix + 'path:' + path)
+        pipe.execute()
+
+    def clear(self):
+        for name in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(name)
+
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+class PageCache(object):
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.timeout = 60
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CACHE_ENABLED', True)
+        self.timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 60)
+        self.backend = self._make_backend(app.config)
+
+    def _make_backend(self, config):
+        if config.get('CACHE_BACKEND', 'lru') == 'redis':
+            try:
+                import redis
+                client = redis.Redis.from_url(config['CACHE_REDIS_URL'])
+                client.ping()
+                return RedisBackend(client)
+            except Exception:
+                # Local stand-in: keep serving with a per-process cache
+                # rather than failing every cached page.
+                logger.warning('Redis cache unavailable, using in-process LRU', exc_info=True)
+        return LRUBackend(config.get('CACHE_MAX_ENTRIES', 1024))
+
+    def cached(self, view):
+        # Caches successful GET responses keyed by path and query string,
+        # plus the page version when @conditional has computed one, so an
+        # entry rendered from older data is a miss rather than a stale hit.
+        # Requests with pending flash messages bypass the cache, since the
+        # page has to show (and consume) them, and so do requests pinned to
+        # the primary after a write, since other users' entries may have
+        # been rendered from a replica that has not caught up yet.
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.enabled or request.method != 'GET' or session.get('_flashes') or pinned_to_primary():
+                return view(*args, **kwargs)
+
+            path = request.path
+            key = request.full_path.rstrip('?')
+            if g.get('page_version'):
+                key += '#' + g.page_version
+            entry = self.backend.get(path, key)
+            if entry is not None:
+                self._count('hits')
+                body, status, content_type = entry
+                return Response(body, status=status, content_type=content_type)
+
+            self._count('misses')
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                self.backend.set(
+                    path, key,
+                    (response.get_data(), response.status_code, response.content_type),
+                    self.timeout
+                )
+            return response
+        return wrapper
+
+    def invalidate(self, *paths):
+        for path in paths:
+            self.backend.delete_path(path)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions,
+        }
+
+    def _count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+page_cache = PageCache()
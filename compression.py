@@ -0,0 +1,130 @@
+import zlib
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Response compression.
+#
+# WSGI middleware that gzip- (or, with the brotli package installed,
+# brotli-) compresses responses as they stream out. The decision is made
+# from the status and headers alone: compressible types at or above
+# COMPRESS_MIN_SIZE, or of unknown length, are compressed chunk by chunk,
+# with a flush every COMPRESS_FLUSH_BYTES so a streamed page still reaches
+# the browser while it is being generated. Responses that are already
+# encoded (e.g. precompressed static files), partial or marked
+# no-transform pass through untouched.
+#----------------------------------------------------------------------------#
+
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'application/x-ndjson', 'image/svg+xml',
+)
+
+
+class GzipCompressor(object):
+
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliCompressor(object):
+
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class Compress(object):
+
+    def __init__(self, app, min_size=500, level=6, flush_bytes=16384, types=COMPRESSIBLE_TYPES):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+        self.flush_bytes = flush_bytes
+        self.types = types
+
+    def choose_encoding(self, environ):
+        accepted = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def should_compress(self, status, headers):
+        code = int(status.split(' ', 1)[0])
+        if code < 200 or code >= 300 or code in (204, 206):
+            return False
+        if 'Content-Encoding' in headers or 'no-transform' in headers.get('Cache-Control', ''):
+            return False
+        if headers.get('Content-Type', '').split(';')[0].strip() not in self.types:
+            return False
+        length = headers.get('Content-Length')
+        return length is None or int(length) >= self.min_size
+
+    def __call__(self, environ, start_response):
+        encoding = self.choose_encoding(environ)
+        if encoding is None or environ['REQUEST_METHOD'] == 'HEAD' or 'HTTP_RANGE' in environ:
+            return self.app(environ, start_response)
+
+        state = {}
+
+        def compressing_start_response(status, headers, exc_info=None):
+            headers = Headers(headers)
+            if self.should_compress(status, headers):
+                state['compressor'] = (BrotliCompressor if encoding == 'br' else GzipCompressor)(self.level)
+                headers.remove('Content-Length')
+                headers['Content-Encoding'] = encoding
+                vary = headers.get('Vary')
+                headers['Vary'] = vary + ', Accept-Encoding' if vary else 'Accept-Encoding'
+                # The compressed body is no longer byte-identical, so a
+                # strong validator becomes a weak one.
+                etag = headers.get('ETag')
+                if etag and not etag.startswith('W/'):
+                    headers['ETag'] = 'W/' + etag
+            return start_response(status, headers.to_wsgi_list(), exc_info)
+
+        return self.compress(self.app(environ, compressing_start_response), state)
+
+    def compress(self, body, state):
+        pending = 0
+        try:
+            for chunk in body:
+                compressor = state.get('compressor')
+                if compressor is None:
+                    yield chunk
+                    continue
+                data = compressor.compress(chunk)
+                pending += len(chunk)
+                if pending >= self.flush_bytes:
+                    data += compressor.flush()
+                    pending = 0
+                if data:
+                    yield data
+            if state.get('compressor') is not None:
+                yield state['compressor'].finish()
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
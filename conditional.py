@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, g, request, session, make_response
+from api import make_etag
+from assets import assets
+
+#----------------------------------------------------------------------------#
+# Conditional GET for pages.
+#
+# A view decorated with @conditional(version_of) answers a GET whose
+# If-None-Match holds the current version with 304 Not Modified before the
+# view runs, so neither the page's queries nor its template are touched.
+# version_of gets the view's arguments and returns one of the cheap
+# versions from queries.py (or None to let the view 404). Other
+# responses carry the version as a weak ETag, the newest timestamp in it
+# as Last-Modified, and Cache-Control: no-cache so browsers revalidate.
+#
+# The ETag is also left in g.page_version, which the page cache adds to
+# its key, so a page cached before the data changed is never served under
+# the new ETag. That is how changes made outside the web workers (imports,
+# `flask rollups refresh`) reach cached pages, so the version is computed
+# even with CONDITIONAL_GET off.
+#
+# If-Modified-Since alone is not honoured: deleting a row changes the
+# version but not its newest timestamp.
+#----------------------------------------------------------------------------#
+
+def last_modified(version):
+    times = [value for value in version if isinstance(value, datetime)]
+    if not times:
+        return None
+    return max(times).replace(tzinfo=timezone.utc)
+
+
+def conditional(version_of):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+            version = version_of(*args, **kwargs)
+            if version is None:
+                return view(*args, **kwargs)
+
+            etag = g.page_version = make_etag((current_app.config.get('RELEASE'), assets.version, version))
+            if not current_app.config.get('CONDITIONAL_GET', True):
+                return view(*args, **kwargs)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified(version)
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
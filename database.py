@@ -0,0 +1,241 @@
+import logging
+import os
+import threading
+import time
+from flask import g, request, session, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm, text
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+#----------------------------------------------------------------------------#
+# Engine configuration.
+#----------------------------------------------------------------------------#
+
+def postgres_engine_options(config):
+    # Engine options for Postgres built from the DB_* settings in config.py.
+    if config.get('DB_PGBOUNCER', False):
+        # PgBouncer in transaction pooling mode owns the pooling: hold no
+        # connections here. psycopg2 never uses server-side prepared
+        # statements, so nothing depends on a connection staying with one
+        # backend.
+        return {'poolclass': NullPool, 'connect_args': {'connect_timeout': config.get('DB_CONNECT_TIMEOUT', 5)}}
+
+    options = {
+        'pool_size': config.get('DB_POOL_SIZE', 10),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+    }
+    # A host that stops answering fails the connect after this many seconds
+    # rather than the OS's TCP timeout.
+    options['connect_args'] = {'connect_timeout': config.get('DB_CONNECT_TIMEOUT', 5)}
+    return options
+
+
+#----------------------------------------------------------------------------#
+# Read replicas.
+#
+# Each URI in SQLALCHEMY_REPLICA_URIS becomes an extra engine. GET and HEAD
+# requests read from one replica, picked round-robin per request; every
+# other request, and any flush, goes to the primary. A replica that fails a
+# health check (or drops a connection mid-query) is skipped for
+# REPLICA_RETRY_SECONDS. The checks run every REPLICA_HEALTH_CHECK_INTERVAL
+# seconds on a background thread, never on a request. After a user commits a write their session is
+# pinned to the primary for REPLICA_STICKY_SECONDS, so they read their own
+# write even if the replicas lag behind.
+#----------------------------------------------------------------------------#
+
+STICKY_KEY = '_primary_until'
+
+
+class ReplicaSet(object):
+
+    def __init__(self, db, app, keys):
+        self.db = db
+        self.app = app
+        self.keys = keys
+        self.check_interval = app.config.get('REPLICA_HEALTH_CHECK_INTERVAL', 5)
+        self.retry_after = app.config.get('REPLICA_RETRY_SECONDS', 30)
+        self.lock = threading.Lock()
+        self.position = 0
+        self.engines = {}
+        self.down_until = {}
+        self.checker_pid = None
+
+    def engine(self, key):
+        engine = self.engines.get(key)
+        if engine is None:
+            engine = self.engines[key] = self.db.get_engine(self.app, bind=key)
+            event.listen(engine, 'handle_error', lambda context: self.connection_error(key, context))
+        return engine
+
+    def connection_error(self, key, context):
+        if context.is_disconnect:
+            self.mark_down(key)
+
+    def mark_down(self, key):
+        if self.is_up(key):
+            logger.warning('Replica %s is down, reading from the others for %ss', key, self.retry_after)
+        self.down_until[key] = time.monotonic() + self.retry_after
+
+    def is_up(self, key):
+        return self.down_until.get(key, 0) <= time.monotonic()
+
+    def start_checks(self):
+        # A forked worker starts its own checker, since threads do not
+        # survive the fork.
+        with self.lock:
+            if self.checker_pid != os.getpid():
+                self.checker_pid = os.getpid()
+                threading.Thread(target=self.run_checks, name='replica-checks', daemon=True).start()
+
+    def stop_checks(self):
+        self.checker_pid = None
+
+    def run_checks(self):
+        pid = os.getpid()
+        while self.checker_pid == pid:
+            for key in self.keys:
+                self.check(key)
+            time.sleep(self.check_interval)
+
+    def check(self, key):
+        # A replica that is down is checked too, and stays down until
+        # REPLICA_RETRY_SECONDS after its last failed check.
+        with self.lock:
+            engine = self.engine(key)
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except Exception:
+            self.mark_down(key)
+
+    def choose(self):
+        # The next healthy replica engine, or None if all are down.
+        self.start_checks()
+        with self.lock:
+            start = self.position
+            self.position = (self.position + 1) % len(self.keys)
+        for offset in range(len(self.keys)):
+            key = self.keys[(start + offset) % len(self.keys)]
+            if self.is_up(key):
+                return self.engine(key)
+        return None
+
+    def status(self):
+        return [(key, self.down_until.get(key, 0) <= time.monotonic()) for key in self.keys]
+
+
+def pinned_to_primary():
+    # True for REPLICA_STICKY_SECONDS after this user's last write.
+    return has_request_context() and session.get(STICKY_KEY, 0) > time.time()
+
+
+def reads_from_replica(session_):
+    if not has_request_context() or request.method not in ('GET', 'HEAD'):
+        return False
+    if session_._flushing:
+        return False
+    return not pinned_to_primary()
+
+
+def request_replica(db, session_):
+    # The replica engine this request reads from, picked once per request,
+    # or None when it reads from the primary.
+    if db.replicas is None or not reads_from_replica(session_):
+        return None
+    if 'replica_engine' not in g:
+        g.replica_engine = db.replicas.choose()
+    return g.replica_engine
+
+
+class RoutingSession(SignallingSession):
+
+    def __init__(self, db, **options):
+        self.db = db
+        super(RoutingSession, self).__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = request_replica(self.db, self)
+        if replica is not None:
+            return replica
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def remember_write(session_, flush_context):
+    session_.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def remember_bulk_write(orm_execute_state):
+    # Query.update()/delete() and DML passed to session.execute() write
+    # without flushing.
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_begin')
+def set_statement_timeout(session_, transaction, connection):
+    # Only web requests get DB_STATEMENT_TIMEOUT_MS: migrations, imports,
+    # exports and the other CLI commands may run far longer. SET LOCAL
+    # ends with the transaction, so it also holds through PgBouncer.
+    timeout = session_.app.config.get('DB_STATEMENT_TIMEOUT_MS')
+    if timeout and has_request_context() and connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('SET LOCAL statement_timeout = {:d}'.format(timeout))
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def pin_to_primary(session_):
+    if session_.info.pop('wrote', False) and has_request_context():
+        window = session_.app.config.get('REPLICA_STICKY_SECONDS', 5)
+        if session_.db.replicas is not None and window:
+            session[STICKY_KEY] = time.time() + window
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def forget_write(session_):
+    session_.info.pop('wrote', None)
+
+
+#----------------------------------------------------------------------------#
+# Database.
+#----------------------------------------------------------------------------#
+
+class Database(SQLAlchemy):
+
+    def __init__(self, *args, **kwargs):
+        self.replicas = None
+        super(Database, self).__init__(*args, **kwargs)
+
+    def init_app(self, app):
+        keys = []
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', None) or {}
+        for number, uri in enumerate(app.config.get('SQLALCHEMY_REPLICA_URIS') or ()):
+            key = 'replica_{}'.format(number)
+            binds[key] = uri
+            keys.append(key)
+        if keys:
+            app.config['SQLALCHEMY_BINDS'] = binds
+            self.replicas = ReplicaSet(self, app, keys)
+        super(Database, self).init_app(app)
+
+    def _execute_for_all_tables(self, app, bind, operation, skip_tables=False):
+        # create_all() and friends leave the replicas alone; they get their
+        # schema from the primary.
+        if bind == '__all__' and self.replicas is not None:
+            app = self.get_app(app)
+            bind = [None] + [key for key in app.config['SQLALCHEMY_BINDS'] if key not in self.replicas.keys]
+        return super(Database, self)._execute_for_all_tables(app, bind, operation, skip_tables)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        sa_url, options = super(Database, self).apply_driver_hacks(app, sa_url, options)
+        if sa_url.get_backend_name() == 'postgresql':
+            options.update(postgres_engine_options(app.config))
+        return sa_url, options
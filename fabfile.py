@@ -7,12 +7,18 @@ from fabric.contrib.console import confirm
 def test():
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m pytest -q tests", capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def bench():
+    local(
+        "FLASK_APP=app flask bench run --mode client --requests 20"
+    )
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -39,8 +45,9 @@ def heroku():
 
 
 def heroku_test():
+    # pytest is a development dependency, not in requirements.txt.
     local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
+        "heroku run 'pip install pytest && python -m pytest -q tests'"
     )
 
 
@@ -1,8 +1,9 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from re import RegexFlag
+from flask import current_app
 from flask_wtf import Form
 from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, ValidationError
+from wtforms.validators import DataRequired, AnyOf, URL, Optional, ValidationError
 import re
 
 def validate_phone(self, field):
@@ -21,6 +22,17 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    end_time = DateTimeField(
+        'end_time',
+        validators=[Optional()]
+    )
+
+    def validate_end_time(self, field):
+        if field.data and self.start_time.data and field.data <= self.start_time.data:
+            raise ValidationError('End time must be after the start time')
+        hours = current_app.config.get('SHOW_MAX_DURATION_HOURS', 24)
+        if field.data and self.start_time.data and field.data - self.start_time.data > timedelta(hours=hours):
+            raise ValidationError('A show can last at most {} hours'.format(hours))
 
 class VenueForm(Form):
     name = StringField(
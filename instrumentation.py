@@ -0,0 +1,125 @@
+import heapq
+import json
+import logging
+import time
+from collections import Counter
+from logging import FileHandler, Formatter
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# SQL instrumentation.
+#
+# With SQL_INSTRUMENTATION enabled, every statement run while handling a
+# request is timed through the engine cursor events. When the request
+# finishes its query count and DB time go out in a Server-Timing header,
+# and requests that are slow, contain a slow statement or repeat the same
+# statement more than N_PLUS_ONE_THRESHOLD times are written to the slow
+# log as one JSON object per line.
+#----------------------------------------------------------------------------#
+
+STATEMENT_PREVIEW = 500
+SLOWEST_KEPT = 5
+
+
+class RequestStats(object):
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.slowest = []
+        self.shapes = Counter()
+
+    def record(self, statement, elapsed):
+        self.query_count += 1
+        self.db_time += elapsed
+        self.shapes[statement] += 1
+        entry = (elapsed, statement)
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+
+def current_stats():
+    # The RequestStats of the request being handled, or None.
+    if has_app_context():
+        return g.get('sql_stats')
+    return None
+
+
+class SQLInstrumentation(object):
+
+    def __init__(self, app=None):
+        self.logger = logging.getLogger('fyyur.slow')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('SQL_INSTRUMENTATION', False):
+            return
+        self.slow_request = app.config.get('SLOW_REQUEST_MS', 500) / 1000.0
+        self.slow_query = app.config.get('SLOW_QUERY_MS', 100) / 1000.0
+        self.repeat_threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 10)
+
+        handler = FileHandler(app.config.get('SLOW_LOG_FILE', 'slow.log'))
+        handler.setFormatter(Formatter('%(message)s'))
+        self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+
+        event.listen(Engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self.after_cursor_execute)
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        stats = current_stats()
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+    def start_request(self):
+        g.sql_stats = RequestStats()
+
+    def finish_request(self, response):
+        # Streamed responses are measured up to the point the body starts.
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        duration = time.perf_counter() - stats.started
+        response.headers.add('Server-Timing', 'db;dur={:.1f};desc="{} queries"'.format(
+            stats.db_time * 1000, stats.query_count
+        ))
+
+        slowest = sorted(stats.slowest, reverse=True)
+        repeated = [(count, statement) for statement, count in stats.shapes.most_common()
+                    if count > self.repeat_threshold]
+        if duration >= self.slow_request or repeated or (slowest and slowest[0][0] >= self.slow_query):
+            self.logger.info(json.dumps({
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 1),
+                'query_count': stats.query_count,
+                'db_ms': round(stats.db_time * 1000, 1),
+                'slowest': [
+                    {'ms': round(elapsed * 1000, 1), 'statement': statement[:STATEMENT_PREVIEW]}
+                    for elapsed, statement in slowest
+                ],
+                'n_plus_one': [
+                    {'count': count, 'statement': statement[:STATEMENT_PREVIEW]}
+                    for count, statement in repeated
+                ],
+            }))
+        return response
+
+
+sql_instrumentation = SQLInstrumentation()
@@ -0,0 +1,210 @@
+import glob
+import json
+import os
+import threading
+import time
+from flask import g, request, Response
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#
+# In-process counters and histograms rendered in the Prometheus text format
+# at /metrics. Updates take one lock, so they are safe under threaded
+# servers. Under a pre-forking server (gunicorn) set METRICS_MULTIPROC_DIR:
+# every worker then writes a snapshot of its own values to
+# <dir>/<pid>.json at most every METRICS_FLUSH_INTERVAL seconds, and a
+# scrape, whichever worker serves it, adds up the snapshots of all workers.
+#----------------------------------------------------------------------------#
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metrics(object):
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+        self.last_flush = 0.0
+        self.multiproc_dir = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.multiproc_dir = app.config.get('METRICS_MULTIPROC_DIR')
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 5)
+        if self.multiproc_dir:
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        before_render_template.connect(self.start_render, app)
+        template_rendered.connect(self.finish_render, app)
+        event.listen(Pool, 'checkout', self.pool_checkout)
+        app.add_url_rule('/metrics', 'metrics', self.export)
+
+    #  Recording
+    #  ----------------------------------------------------------------
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, tuple(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(buckets), 0.0, 0, buckets]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def collector(self, function):
+        # Registers a function returning [(type, name, labels, value)] that is
+        # sampled whenever the metrics are exported or flushed.
+        self.collectors.append(function)
+        return function
+
+    def start_request(self):
+        g.metrics_started = time.perf_counter()
+
+    def finish_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            self.observe('fyyur_request_duration_seconds', (('endpoint', endpoint),),
+                         time.perf_counter() - started)
+            self.inc('fyyur_requests_total', (
+                ('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))
+            ))
+        if self.multiproc_dir and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+        return response
+
+    def count_error(self, code):
+        self.inc('fyyur_http_errors_total', (('code', str(code)),))
+
+    def start_render(self, sender, template, context, **extra):
+        g.setdefault('metrics_renders', []).append(time.perf_counter())
+
+    def finish_render(self, sender, template, context, **extra):
+        renders = g.get('metrics_renders')
+        if renders:
+            self.observe('fyyur_template_render_seconds', (('template', template.name or 'string'),),
+                         time.perf_counter() - renders.pop())
+
+    def pool_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.inc('fyyur_db_pool_checkouts_total')
+
+    #  Export
+    #  ----------------------------------------------------------------
+
+    def snapshot(self):
+        with self.lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self.counters.items()]
+            histograms = [
+                [name, list(labels), list(histogram[0]), histogram[1], histogram[2], list(histogram[3])]
+                for (name, labels), histogram in self.histograms.items()
+            ]
+        gauges = []
+        for collect in self.collectors:
+            for kind, name, labels, value in collect():
+                if kind == 'counter':
+                    counters.append([name, list(labels), value])
+                else:
+                    gauges.append([name, list(labels) + [('pid', str(os.getpid()))], value])
+        return {'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        path = os.path.join(self.multiproc_dir, '{}.json'.format(os.getpid()))
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def snapshots(self):
+        if not self.multiproc_dir:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.multiproc_dir, '*.json')):
+            pid = int(os.path.basename(path).split('.')[0])
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            # Counters of exited workers still count; their gauges do not.
+            if not pid_alive(pid):
+                snapshot['gauges'] = []
+            snapshots.append(snapshot)
+        return snapshots
+
+    def render(self):
+        counters = {}
+        histograms = {}
+        gauges = {}
+        for snapshot in self.snapshots():
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, buckets, total, count, bounds in snapshot['histograms']:
+                key = (name, tuple(map(tuple, labels)), tuple(bounds))
+                merged = histograms.setdefault(key, [[0] * len(bounds), 0.0, 0])
+                merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+                merged[1] += total
+                merged[2] += count
+            for name, labels, value in snapshot['gauges']:
+                gauges[(name, tuple(map(tuple, labels)))] = value
+
+        lines = []
+        for kind, samples in (('counter', counters), ('gauge', gauges)):
+            for name in sorted({key[0] for key in samples}):
+                lines.append('# TYPE {} {}'.format(name, kind))
+                for (sample_name, labels), value in sorted(samples.items()):
+                    if sample_name == name:
+                        lines.append('{}{} {}'.format(name, format_labels(labels), value))
+        for name in sorted({key[0] for key in histograms}):
+            lines.append('# TYPE {} histogram'.format(name))
+            for (sample_name, labels, bounds), (buckets, total, count) in sorted(histograms.items()):
+                if sample_name != name:
+                    continue
+                for bound, bucket in zip(bounds, buckets):
+                    lines.append('{}_bucket{} {}'.format(name, format_labels(labels + (('le', repr(bound)),)), bucket))
+                lines.append('{}_bucket{} {}'.format(name, format_labels(labels + (('le', '+Inf'),)), count))
+                lines.append('{}_sum{} {}'.format(name, format_labels(labels), total))
+                lines.append('{}_count{} {}'.format(name, format_labels(labels), count))
+        return '\n'.join(lines) + '\n'
+
+    def export(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in labels
+    ) + '}'
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+metrics = Metrics()
@@ -0,0 +1,59 @@
+"""add name search indexes
+
+Revision ID: 3b9d1f6a2c47
+Revises: e0339f6c504b
+Create Date: 2026-10-18 09:12:04.118533
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9d1f6a2c47'
+down_revision = 'e0339f6c504b'
+branch_labels = None
+depends_on = None
+
+SEARCHABLE_TABLES = ('venue', 'artist')
+
+
+def upgrade():
+    # Trigram and full-text indexes are Postgres features; other databases
+    # fall back to a plain ILIKE scan in search.py.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in SEARCHABLE_TABLES:
+        op.create_index(
+            'ix_{}_name_trgm'.format(table), table, ['name'],
+            postgresql_using='gin',
+            postgresql_ops={'name': 'gin_trgm_ops'}
+        )
+
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute(
+            "UPDATE {} SET search_vector = to_tsvector('pg_catalog.simple', coalesce(name, ''))".format(table)
+        )
+        op.create_index(
+            'ix_{}_search_vector'.format(table), table, ['search_vector'],
+            postgresql_using='gin'
+        )
+        op.execute(
+            "CREATE TRIGGER {0}_search_vector_update BEFORE INSERT OR UPDATE OF name ON {0} "
+            "FOR EACH ROW EXECUTE PROCEDURE "
+            "tsvector_update_trigger(search_vector, 'pg_catalog.simple', name)".format(table)
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for table in SEARCHABLE_TABLES:
+        op.execute('DROP TRIGGER IF EXISTS {0}_search_vector_update ON {0}'.format(table))
+        op.drop_index('ix_{}_search_vector'.format(table), table_name=table)
+        op.drop_column(table, 'search_vector')
+        op.drop_index('ix_{}_name_trgm'.format(table), table_name=table)
@@ -0,0 +1,86 @@
+"""normalize genres
+
+Revision ID: 5e7a0b3c9f12
+Revises: 8c2e4a7f1d90
+Create Date: 2026-10-18 11:26:31.804417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7a0b3c9f12'
+down_revision = '8c2e4a7f1d90'
+branch_labels = None
+depends_on = None
+
+# (owner table, association table, owner key column)
+GENRE_OWNERS = (
+    ('venue', 'venue_genre', 'venue_id'),
+    ('artist', 'artist_genre', 'artist_id'),
+)
+
+
+def upgrade():
+    genre = op.create_table('genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for owner, table, key in GENRE_OWNERS:
+        op.create_table(table,
+        sa.Column(key, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint([key], [owner + '.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(key, 'genre_id')
+        )
+        op.create_index('ix_{}_genre_id_{}'.format(table, key), table, ['genre_id', key], unique=False)
+
+    # Convert the comma-joined strings into genre rows and associations.
+    connection = op.get_bind()
+    owned = {}
+    names = {}
+    for owner, table, key in GENRE_OWNERS:
+        rows = connection.execute(sa.text('SELECT id, genres FROM ' + owner)).fetchall()
+        owned[owner] = []
+        for owner_id, genres in rows:
+            for name in dict.fromkeys(g.strip() for g in (genres or '').split(',')):
+                if name:
+                    names.setdefault(name, len(names) + 1)
+                    owned[owner].append((owner_id, name))
+
+    if names:
+        op.bulk_insert(genre, [{'id': genre_id, 'name': name} for name, genre_id in names.items()])
+        if connection.dialect.name == 'postgresql':
+            op.execute("SELECT setval('genre_id_seq', (SELECT max(id) FROM genre))")
+    for owner, table, key in GENRE_OWNERS:
+        association = sa.table(table, sa.column(key), sa.column('genre_id'))
+        if owned[owner]:
+            op.bulk_insert(association, [
+                {key: owner_id, 'genre_id': names[name]} for owner_id, name in owned[owner]
+            ])
+        op.drop_column(owner, 'genres')
+
+
+def downgrade():
+    connection = op.get_bind()
+    for owner, table, key in GENRE_OWNERS:
+        op.add_column(owner, sa.Column('genres', sa.String(), nullable=True))
+        rows = connection.execute(sa.text(
+            'SELECT a.{0}, g.name FROM {1} a JOIN genre g ON g.id = a.genre_id '
+            'ORDER BY a.{0}, g.name'.format(key, table)
+        )).fetchall()
+        joined = {}
+        for owner_id, name in rows:
+            joined.setdefault(owner_id, []).append(name)
+        for owner_id, genres in joined.items():
+            connection.execute(
+                sa.text('UPDATE {} SET genres = :genres WHERE id = :id'.format(owner)),
+                {'genres': ','.join(genres), 'id': owner_id}
+            )
+        op.drop_index('ix_{}_genre_id_{}'.format(table, key), table_name=table)
+        op.drop_table(table)
+    op.drop_table('genre')
@@ -0,0 +1,36 @@
+"""add updated_at columns
+
+Revision ID: 9d4f2b6e8a31
+Revises: 5e7a0b3c9f12
+Create Date: 2026-10-18 12:40:15.093372
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4f2b6e8a31'
+down_revision = '5e7a0b3c9f12'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venue', 'artist', 'show')
+
+
+def upgrade():
+    # Existing rows are stamped with the migration time, in UTC like the
+    # values the models write.
+    if op.get_bind().dialect.name == 'postgresql':
+        now = sa.text("timezone('utc', now())")
+    else:
+        now = sa.func.current_timestamp()
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=now))
+        op.create_index(op.f('ix_{}_updated_at'.format(table)), table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index(op.f('ix_{}_updated_at'.format(table)), table_name=table)
+        op.drop_column(table, 'updated_at')
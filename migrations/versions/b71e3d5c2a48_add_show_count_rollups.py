@@ -0,0 +1,55 @@
+"""add show count rollups
+
+Revision ID: b71e3d5c2a48
+Revises: 9d4f2b6e8a31
+Create Date: 2026-10-18 13:05:42.518204
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71e3d5c2a48'
+down_revision = '9d4f2b6e8a31'
+branch_labels = None
+depends_on = None
+
+ROLLUPS = (('venue', 'venue_id'), ('artist', 'artist_id'))
+
+
+def upgrade():
+    watermark = op.create_table(
+        'rollup_watermark',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('value', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    for table, _ in ROLLUPS:
+        op.add_column(table, sa.Column('upcoming_show_count', sa.Integer(), nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('past_show_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill the counts as of the migration time, which becomes the
+    # first watermark.
+    now = datetime.utcnow()
+    op.bulk_insert(watermark, [{'name': 'shows', 'value': now}])
+    show = sa.table('show', sa.column('id'), sa.column('start_time'), sa.column('venue_id'), sa.column('artist_id'))
+    for table, key in ROLLUPS:
+        rollup = sa.table(table, sa.column('id'), sa.column('upcoming_show_count'), sa.column('past_show_count'))
+
+        def show_count(condition):
+            return sa.select(sa.func.count(show.c.id)).where(
+                show.c[key] == rollup.c.id, condition
+            ).scalar_subquery()
+        op.execute(rollup.update().values(
+            upcoming_show_count=show_count(show.c.start_time >= now),
+            past_show_count=show_count(show.c.start_time < now)
+        ))
+
+
+def downgrade():
+    for table, _ in ROLLUPS:
+        op.drop_column(table, 'past_show_count')
+        op.drop_column(table, 'upcoming_show_count')
+    op.drop_table('rollup_watermark')
@@ -0,0 +1,37 @@
+"""add show end_time
+
+Revision ID: c4a9e2f1b736
+Revises: b71e3d5c2a48
+Create Date: 2026-10-18 13:48:20.671935
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a9e2f1b736'
+down_revision = 'b71e3d5c2a48'
+branch_labels = None
+depends_on = None
+
+# Existing shows get the default show length (SHOW_DEFAULT_DURATION_MINUTES).
+DEFAULT_DURATION_MINUTES = 120
+
+
+def upgrade():
+    op.add_column('show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    if op.get_bind().dialect.name == 'postgresql':
+        end_time = sa.text("start_time + interval '{} minutes'".format(DEFAULT_DURATION_MINUTES))
+    else:
+        end_time = sa.func.datetime(sa.column('start_time'), '+{} minutes'.format(DEFAULT_DURATION_MINUTES))
+    show = sa.table('show', sa.column('start_time'), sa.column('end_time'))
+    op.execute(show.update().where(show.c.start_time.isnot(None)).values(end_time=end_time))
+    with op.batch_alter_table('show') as batch_op:
+        batch_op.create_check_constraint('ck_show_end_after_start', 'end_time > start_time')
+
+
+def downgrade():
+    with op.batch_alter_table('show') as batch_op:
+        batch_op.drop_constraint('ck_show_end_after_start', type_='check')
+        batch_op.drop_column('end_time')
@@ -0,0 +1,57 @@
+"""add show booking exclusion constraints
+
+Revision ID: d2f8b5a0c913
+Revises: c4a9e2f1b736
+Create Date: 2026-10-18 13:52:47.305118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f8b5a0c913'
+down_revision = 'c4a9e2f1b736'
+branch_labels = None
+depends_on = None
+
+# start_time and end_time are naive UTC timestamps, hence tsrange rather
+# than tstzrange.
+CONSTRAINTS = (('show_venue_no_overlap', 'venue_id'), ('show_artist_no_overlap', 'artist_id'))
+
+# Shows without a start time have no end time either, and tsrange(NULL,
+# NULL) is unbounded, so they would overlap everything; leave them out as
+# `flask shows conflicts` does.
+
+
+def upgrade():
+    # Exclusion constraints are a Postgres feature; elsewhere bookings.py
+    # checks for conflicts before inserting.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for name, column in CONSTRAINTS:
+        conflicts = op.get_bind().execute(sa.text(
+            'SELECT count(*) FROM "show" a JOIN "show" b ON a.{0} = b.{0} AND a.id < b.id '
+            'AND tsrange(a.start_time, a.end_time) && tsrange(b.start_time, b.end_time) '
+            'WHERE a.start_time IS NOT NULL AND b.start_time IS NOT NULL'.format(column)
+        )).scalar()
+        if conflicts:
+            raise RuntimeError(
+                '{} existing shows overlap on {}; list them with `flask shows conflicts`, '
+                'resolve them and run the upgrade again'.format(conflicts, column)
+            )
+        op.execute(
+            'ALTER TABLE "show" ADD CONSTRAINT {} EXCLUDE USING gist '
+            '({} WITH =, tsrange(start_time, end_time) WITH &&) '
+            'WHERE (start_time IS NOT NULL)'.format(name, column)
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for name, _ in CONSTRAINTS:
+        op.execute('ALTER TABLE "show" DROP CONSTRAINT IF EXISTS {}'.format(name))
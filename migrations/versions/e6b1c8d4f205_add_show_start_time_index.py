@@ -0,0 +1,26 @@
+"""add show start_time index
+
+Revision ID: e6b1c8d4f205
+Revises: d2f8b5a0c913
+Create Date: 2026-10-18 14:21:09.840377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b1c8d4f205'
+down_revision = 'd2f8b5a0c913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Serves the /shows calendar's start_time range scans and the
+    # (start_time, id) keyset pages of the shows listing.
+    op.create_index('ix_show_start_time_id', 'show', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_start_time_id', table_name='show')
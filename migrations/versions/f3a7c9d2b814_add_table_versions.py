@@ -0,0 +1,35 @@
+"""add table versions
+
+Revision ID: f3a7c9d2b814
+Revises: e6b1c8d4f205
+Create Date: 2026-10-18 19:02:17.304611
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a7c9d2b814'
+down_revision = 'e6b1c8d4f205'
+branch_labels = None
+depends_on = None
+
+TABLES = ('artist', 'show', 'venue')
+
+
+def upgrade():
+    table_version = op.create_table(
+        'table_version',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    now = datetime.utcnow()
+    op.bulk_insert(table_version, [{'name': name, 'version': 1, 'updated_at': now} for name in TABLES])
+
+
+def downgrade():
+    op.drop_table('table_version')
@@ -1,9 +1,46 @@
-from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import Database
+db = Database()
+
+
+venue_genre = db.Table(
+    'venue_genre',
+    db.Column('venue_id', db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_venue_genre_genre_id_venue_id', 'genre_id', 'venue_id')
+)
+
+artist_genre = db.Table(
+    'artist_genre',
+    db.Column('artist_id', db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_artist_genre_genre_id_artist_id', 'genre_id', 'artist_id')
+)
+
+class Genre(db.Model):
+    __tablename__ = 'genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(), nullable=False, unique=True)
+
+    @classmethod
+    def from_names(cls, names):
+      # Existing genres are reused; unknown names become new Genre rows.
+      names = list(dict.fromkeys(names))
+      existing = {genre.name: genre for genre in cls.query.filter(cls.name.in_(names))}
+      return [existing.get(name) or cls(name=name) for name in names]
+
+    def __repr__(self):
+      return f'<Genre ID: {self.id}, Genre Name: {self.name}>'
 
 
 class Venue(db.Model):
     __tablename__ = 'venue'
+    __table_args__ = (
+        db.Index('ix_venue_city_state', 'city', 'state'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(), nullable=False)
@@ -14,11 +51,14 @@ class Venue(db.Model):
     image_link = db.Column(db.String())
     facebook_link = db.Column(db.String())
 
-    genres = db.Column(db.String())
+    genres = db.relationship('Genre', secondary=venue_genre, order_by='Genre.name')
     website = db.Column(db.String())
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String())
     show = db.relationship('Show', backref='venue', lazy=True)
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     def __repr__(self):
       return f'<Venue ID: {self.id}, Venue Name: {self.name}>'
@@ -34,18 +74,108 @@ class Artist(db.Model):
     image_link = db.Column(db.String())
     facebook_link = db.Column(db.String())
 
-    genres = db.Column(db.String())
+    genres = db.relationship('Genre', secondary=artist_genre, order_by='Genre.name')
     website = db.Column(db.String())
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String())
     show = db.relationship('Show', backref='artist', lazy=True)
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     def __repr__(self):
       return f'<Artist ID: {self.id}, Artist Name: {self.name}>'
 
 class Show(db.Model):
     __tablename__ = 'show'
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        db.CheckConstraint('end_time > start_time', name='ck_show_end_after_start'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     start_time= db.Column(db.DateTime)
+    end_time = db.Column(db.DateTime)
     venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'))
-    artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'))
\ No newline at end of file
+    artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+
+class RollupWatermark(db.Model):
+    # The instant the show count rollups are split at (see rollups.py).
+    __tablename__ = 'rollup_watermark'
+
+    name = db.Column(db.String(), primary_key=True)
+    value = db.Column(db.DateTime, nullable=False)
+
+
+class TableVersion(db.Model):
+    # Bumped in every transaction that writes to the table, so the pages
+    # and API responses built from it have a version that costs one
+    # primary-key lookup to read (see queries.py).
+    __tablename__ = 'table_version'
+
+    name = db.Column(db.String(), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+VERSIONED_TABLES = ('artist', 'show', 'venue')
+
+
+def mark_written(session, names):
+    # Core statements that bypass the flush (bulk imports, rollup counts)
+    # report the tables they wrote here.
+    session.info.setdefault('written_tables', set()).update(
+        name for name in names if name in VERSIONED_TABLES
+    )
+
+
+@event.listens_for(Session, 'after_flush')
+def mark_flushed(session, flush_context):
+    objects = list(session.new) + list(session.deleted) + [
+        obj for obj in session.dirty if session.is_modified(obj)
+    ]
+    mark_written(session, [getattr(obj, '__tablename__', None) for obj in objects])
+
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def mark_bulk_written(context):
+    # Query.update() and Query.delete() bypass the flush.
+    if context.result.rowcount:
+        mark_written(context.session, [context.mapper.local_table.name])
+
+
+@event.listens_for(Session, 'before_commit')
+def bump_versions(session):
+    # One bump per written table and transaction, taken last and in name
+    # order, so writers queue on a version row only while committing and
+    # never wait on each other in opposite orders.
+    session.flush()
+    names = session.info.pop('written_tables', None)
+    if not names:
+        return
+    table = TableVersion.__table__
+    connection = session.connection()
+    for name in sorted(names):
+        now = datetime.utcnow()
+        values = {'version': table.c.version + 1, 'updated_at': now}
+        if not connection.execute(table.update().where(table.c.name == name).values(values)).rowcount:
+            # A database created without migrations starts with no rows.
+            connection.execute(table.insert().values(name=name, version=1, updated_at=now))
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_written(session):
+    session.info.pop('written_tables', None)
+
+
+@event.listens_for(Session, 'before_flush')
+def touch_updated_at(session, flush_context, instances):
+    # onupdate only fires when a column changes; this also catches changes
+    # that only touch a relationship, such as an edited genre list.
+    for obj in session.dirty:
+        if hasattr(obj, 'updated_at') and session.is_modified(obj):
+            obj.updated_at = datetime.utcnow()
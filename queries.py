@@ -0,0 +1,332 @@
+from datetime import datetime, timedelta, timezone
+from flask import g
+from sqlalchemy import func, tuple_, exists
+from sqlalchemy.orm import joinedload, selectinload
+from models import db, Show, Artist, Venue, Genre, TableVersion, venue_genre, artist_genre
+
+
+#----------------------------------------------------------------------------#
+# Time.
+#
+# Show.start_time is stored as naive UTC. Each request reads the clock once
+# (request_now) and every past/upcoming decision in that request is made
+# against that same instant: a show is upcoming if it starts at or after it,
+# past otherwise.
+#----------------------------------------------------------------------------#
+
+def request_now():
+    if 'now' not in g:
+        g.now = datetime.now(timezone.utc)
+    return g.now
+
+
+def db_time(now):
+    # The aware reference time as the naive UTC value stored in the database.
+    return now.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def partition_shows(shows, now):
+    # Splits shows into (past, upcoming) in a single pass, each ordered by
+    # start time.
+    now = db_time(now)
+    past_shows = []
+    upcoming_shows = []
+    for show in sorted(shows, key=lambda s: s.start_time):
+        if show.start_time < now:
+            past_shows.append(show)
+        else:
+            upcoming_shows.append(show)
+    return past_shows, upcoming_shows
+
+
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+
+def get_venue_directory(genre=None):
+    # Every venue (optionally only those tagged with `genre`) with its
+    # upcoming show count from the rollup column, ordered so that areas
+    # come out sorted and can be grouped in one pass. Ordering by (city,
+    # state) lets the scan follow ix_venue_city_state instead of sorting.
+    query = db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        Venue.upcoming_show_count.label('upcoming_shows')
+    )
+    if genre:
+        query = query.join(venue_genre, venue_genre.c.venue_id == Venue.id).join(
+            Genre, Genre.id == venue_genre.c.genre_id
+        ).filter(Genre.name == genre)
+    rows = query.order_by(
+        Venue.city, Venue.state, Venue.name, Venue.id
+    ).all()
+
+    areas = {}
+    for row in rows:
+        area = areas.get((row.city, row.state))
+        if area is None:
+            area = areas[(row.city, row.state)] = {
+                "city": row.city,
+                "state": row.state,
+                "venues": []
+            }
+        area['venues'].append({
+            'id': row.id,
+            'name': row.name,
+            'upcoming_shows': row.upcoming_shows
+        })
+    return list(areas.values())
+
+
+def venue_detail(venue, genres, past_shows, upcoming_shows):
+    return {
+        "id": venue.id,
+        "name": venue.name,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "genres": genres,
+        "website": venue.website,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+    }
+
+
+def get_venue_detail(venue_id, now):
+    # One round trip: the venue, its shows and each show's artist.
+    venue = Venue.query.options(
+        joinedload(Venue.show).joinedload(Show.artist),
+        selectinload(Venue.genres)
+    ).filter(Venue.id == venue_id).one_or_none()
+    if venue is None:
+        return None
+
+    past_shows, upcoming_shows = [[{
+        'artist_id': show.artist.id,
+        'artist_name': show.artist.name,
+        'artist_image_link': show.artist.image_link,
+        'start_time': show.start_time
+    } for show in shows] for shows in partition_shows(venue.show, now)]
+    return venue_detail(venue, [genre.name for genre in venue.genres], past_shows, upcoming_shows)
+
+
+#----------------------------------------------------------------------------#
+# Artists.
+#----------------------------------------------------------------------------#
+
+def get_artists(genre=None):
+    query = db.session.query(Artist.id, Artist.name)
+    if genre:
+        query = query.join(artist_genre, artist_genre.c.artist_id == Artist.id).join(
+            Genre, Genre.id == artist_genre.c.genre_id
+        ).filter(Genre.name == genre)
+    return [{
+        "id": row.id,
+        "name": row.name
+    } for row in query.order_by(Artist.name, Artist.id)]
+
+
+def artist_detail(artist, genres, past_shows, upcoming_shows):
+    return {
+        "id": artist.id,
+        "name": artist.name,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website,
+        "genres": genres,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+    }
+
+
+def get_artist_detail(artist_id, now):
+    # One round trip: the artist, its shows and each show's venue are
+    # eager-loaded through the Artist.show / Show.venue relationships.
+    artist = Artist.query.options(
+        joinedload(Artist.show).joinedload(Show.venue),
+        selectinload(Artist.genres)
+    ).filter(Artist.id == artist_id).one_or_none()
+    if artist is None:
+        return None
+
+    past_shows, upcoming_shows = [[{
+        "venue_id": show.venue.id,
+        "venue_name": show.venue.name,
+        "venue_image_link": show.venue.image_link,
+        "start_time": show.start_time
+    } for show in shows] for shows in partition_shows(artist.show, now)]
+    return artist_detail(artist, [genre.name for genre in artist.genres], past_shows, upcoming_shows)
+
+
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+def encode_show_cursor(start_time, show_id):
+    return '{}_{}'.format(start_time.isoformat(), show_id)
+
+
+def decode_show_cursor(cursor):
+    # Raises ValueError for anything encode_show_cursor could not have made.
+    start_time, show_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(start_time), int(show_id)
+
+
+class ShowsPage(object):
+    # One keyset page of the shows listing, ordered by (start_time, id).
+    # Rows are fetched lazily while the page is iterated, so it can be fed
+    # straight to a streamed template; next_cursor is set once the page has
+    # been consumed and more shows follow it.
+
+    def __init__(self, limit, after=None):
+        self.limit = limit
+        self.next_cursor = None
+        self.query = db.session.query(
+            Show.id,
+            Show.start_time,
+            Show.end_time,
+            Show.venue_id,
+            Venue.name.label('venue_name'),
+            Show.artist_id,
+            Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link')
+        ).join(Venue, Show.venue_id == Venue.id).join(
+            Artist, Show.artist_id == Artist.id
+        ).filter(Show.start_time.isnot(None))
+        if after is not None:
+            self.query = self.query.filter(tuple_(Show.start_time, Show.id) > tuple_(*after))
+        self.query = self.query.order_by(Show.start_time, Show.id).limit(limit + 1)
+
+    def __iter__(self):
+        self.next_cursor = None
+        last = None
+        for count, row in enumerate(self.query.yield_per(100)):
+            if count == self.limit:
+                self.next_cursor = encode_show_cursor(last.start_time, last.id)
+                break
+            last = row
+            yield {
+                "id": row.id,
+                "venue_id": row.venue_id,
+                "venue_name": row.venue_name,
+                "artist_id": row.artist_id,
+                "artist_name": row.artist_name,
+                "artist_image_link": row.artist_image_link,
+                "start_time": row.start_time,
+                "end_time": row.end_time
+            }
+
+
+def parse_calendar_bound(value, end=False):
+    # An ISO date or datetime. A bare date as the end of a range includes
+    # that whole day. Raises ValueError for anything else.
+    bound = datetime.fromisoformat(value)
+    if bound.tzinfo is not None:
+        bound = db_time(bound)
+    if end and 'T' not in value and ' ' not in value:
+        bound += timedelta(days=1)
+    return bound
+
+
+def get_show_calendar(start, end, city=None, state=None, genre=None, limit=500):
+    # Shows starting in [start, end), optionally at venues in `city` /
+    # `state` and by artists tagged `genre`, grouped by (UTC) day. One
+    # query: a range scan on Show.start_time, or on the venue's
+    # (venue_id, start_time) index once the location narrows the venues.
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.end_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Venue.city,
+        Venue.state,
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Venue, Show.venue_id == Venue.id).join(
+        Artist, Show.artist_id == Artist.id
+    ).filter(Show.start_time >= start, Show.start_time < end)
+    if city:
+        query = query.filter(Venue.city == city)
+    if state:
+        query = query.filter(Venue.state == state)
+    if genre:
+        query = query.filter(exists().where(
+            artist_genre.c.artist_id == Show.artist_id,
+            artist_genre.c.genre_id == Genre.id,
+            Genre.name == genre
+        ))
+    rows = query.order_by(Show.start_time, Show.id).limit(limit + 1).all()
+
+    days = []
+    for row in rows[:limit]:
+        day = row.start_time.date()
+        if not days or days[-1]['date'] != day:
+            days.append({'date': day, 'shows': []})
+        days[-1]['shows'].append(row._asdict())
+    return {
+        'from': start,
+        'to': end,
+        'days': days,
+        'truncated': len(rows) > limit
+    }
+
+
+#----------------------------------------------------------------------------#
+# Versions.
+#
+# Cheap values that change whenever the corresponding page or API response
+# would; used to compute ETags without rendering. Collections use the
+# table_version counters (models.py), one primary-key lookup each.
+#----------------------------------------------------------------------------#
+
+def table_versions(*models):
+    names = [model.__tablename__ for model in models]
+    rows = dict((row.name, (row.version, row.updated_at)) for row in db.session.query(
+        TableVersion.name, TableVersion.version, TableVersion.updated_at
+    ).filter(TableVersion.name.in_(names)))
+    return tuple(value for name in names for value in rows.get(name, (0, None)))
+
+
+def collection_version(model):
+    return table_versions(model)
+
+
+def shows_version():
+    # The list shows venue and artist names and images as well.
+    return table_versions(Show, Venue, Artist)
+
+
+def detail_version(model, show_key, other, other_key, object_id, now):
+    # `model` is the page's Venue or Artist, `other` is the model on the far
+    # side of its shows. The upcoming count and the start of the latest
+    # past show move the version as shows start, since that changes how
+    # the page partitions them.
+    row = db.session.query(
+        model.updated_at,
+        func.count(Show.id),
+        func.count(Show.id).filter(Show.start_time >= db_time(now)),
+        func.max(Show.start_time).filter(Show.start_time < db_time(now)),
+        func.max(Show.updated_at),
+        func.max(other.updated_at)
+    ).outerjoin(Show, show_key == model.id).outerjoin(
+        other, other.id == other_key
+    ).filter(model.id == object_id).group_by(model.id).one_or_none()
+    return tuple(row) if row is not None else None
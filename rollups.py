@@ -0,0 +1,182 @@
+from collections import Counter
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, event, func, inspect, select
+from models import db, Show, Venue, Artist, RollupWatermark, mark_written
+
+#----------------------------------------------------------------------------#
+# Show count rollups.
+#
+# venue/artist.upcoming_show_count and past_show_count split each row's
+# shows at the rollup watermark: shows starting at or after it count as
+# upcoming, earlier ones as past. Creating, moving or deleting a show
+# adjusts the counts in the same transaction. `flask rollups refresh`, run
+# from cron every minute or so, advances the watermark to now and moves the
+# shows that started in between from upcoming to past, so list and search
+# pages lag real time by at most that interval.
+#
+# Writers hold a share lock on the watermark row and the refresh an update
+# lock, so a show is never counted against a watermark that is being moved.
+#----------------------------------------------------------------------------#
+
+WATERMARK = 'shows'
+ROLLUPS = ((Venue, 'venue_id'), (Artist, 'artist_id'))
+
+
+def current_watermark(connection, exclusive=False):
+    query = select(RollupWatermark.value).where(RollupWatermark.name == WATERMARK)
+    value = connection.execute(query.with_for_update(read=not exclusive)).scalar()
+    if value is None:
+        # A database created without migrations starts with no shows.
+        value = datetime.utcnow()
+        connection.execute(RollupWatermark.__table__.insert().values(name=WATERMARK, value=value))
+    return value
+
+
+def add_counts(connection, model, column, deltas):
+    # Adds {id: delta} to `column` of `model` in a single executemany.
+    table = model.__table__
+    params = [{'object_id': object_id, 'delta': delta}
+              for object_id, delta in deltas.items() if object_id is not None and delta]
+    if params:
+        connection.execute(
+            table.update().where(table.c.id == bindparam('object_id')).values(
+                {column: table.c[column] + bindparam('delta')}
+            ),
+            params
+        )
+        mark_written(db.session, [table.name])
+
+
+def count_shows(connection, changes):
+    # `changes` are (venue_id, artist_id, start_time, sign) tuples, with
+    # sign 1 for a show added and -1 for a show removed.
+    changes = [change for change in changes if change[2] is not None]
+    if not changes:
+        return
+    watermark = current_watermark(connection)
+    for index, (model, _) in enumerate(ROLLUPS):
+        upcoming = Counter()
+        past = Counter()
+        for change in changes:
+            counts = upcoming if change[2] >= watermark else past
+            counts[change[index]] += change[3]
+        add_counts(connection, model, 'upcoming_show_count', upcoming)
+        add_counts(connection, model, 'past_show_count', past)
+
+
+@event.listens_for(Show, 'after_insert')
+def count_new_show(mapper, connection, show):
+    count_shows(connection, [(show.venue_id, show.artist_id, show.start_time, 1)])
+
+
+@event.listens_for(Show, 'after_delete')
+def uncount_deleted_show(mapper, connection, show):
+    count_shows(connection, [(show.venue_id, show.artist_id, show.start_time, -1)])
+
+
+@event.listens_for(Show, 'after_update')
+def recount_moved_show(mapper, connection, show):
+    state = inspect(show)
+    old = []
+    for name in ('venue_id', 'artist_id', 'start_time'):
+        history = state.attrs[name].history
+        old.append(history.deleted[0] if history.deleted else getattr(show, name))
+    new = [show.venue_id, show.artist_id, show.start_time]
+    if old != new:
+        count_shows(connection, [tuple(old) + (-1,), tuple(new) + (1,)])
+
+
+#----------------------------------------------------------------------------#
+# Refresh and consistency check.
+#----------------------------------------------------------------------------#
+
+def refresh(now=None):
+    # Advances the watermark to `now` and returns the number of shows that
+    # moved from upcoming to past.
+    now = now or datetime.utcnow()
+    connection = db.session.connection()
+    watermark = current_watermark(connection, exclusive=True)
+    if now <= watermark:
+        db.session.rollback()
+        return 0
+
+    crossed = Show.start_time >= watermark, Show.start_time < now
+    moved = db.session.query(func.count(Show.id)).filter(*crossed).scalar()
+    for model, key in ROLLUPS:
+        column = getattr(Show, key)
+        deltas = dict(db.session.query(column, func.count(Show.id)).filter(*crossed).group_by(column))
+        add_counts(connection, model, 'upcoming_show_count', {
+            object_id: -delta for object_id, delta in deltas.items()
+        })
+        add_counts(connection, model, 'past_show_count', deltas)
+    connection.execute(RollupWatermark.__table__.update().where(
+        RollupWatermark.name == WATERMARK
+    ).values(value=now))
+    db.session.commit()
+    return moved
+
+
+def drift(model, key, watermark):
+    # Rows of `model` whose stored counts differ from a recount against
+    # `watermark`, as (id, stored upcoming, stored past, upcoming, past).
+    column = getattr(Show, key)
+    counts = db.session.query(
+        column.label('object_id'),
+        func.count(Show.id).filter(Show.start_time >= watermark).label('upcoming'),
+        func.count(Show.id).filter(Show.start_time < watermark).label('past')
+    ).group_by(column).subquery()
+    upcoming = func.coalesce(counts.c.upcoming, 0)
+    past = func.coalesce(counts.c.past, 0)
+    return db.session.query(
+        model.id, model.upcoming_show_count, model.past_show_count, upcoming, past
+    ).outerjoin(counts, counts.c.object_id == model.id).filter(
+        (model.upcoming_show_count != upcoming) | (model.past_show_count != past)
+    ).order_by(model.id).all()
+
+
+@click.group('rollups')
+def rollups_command():
+    """Maintain the denormalized venue and artist show counts."""
+
+
+@rollups_command.command('refresh')
+@with_appcontext
+def refresh_command():
+    """Move shows that have started since the last run to the past counts."""
+    moved = refresh()
+    click.echo('{} shows moved to past'.format(moved))
+
+
+@rollups_command.command('check')
+@click.option('--fix', is_flag=True, help='Overwrite drifted counts with the recount.')
+@with_appcontext
+def check_command(fix):
+    """Recount every venue and artist from scratch and report drift."""
+    watermark = current_watermark(db.session.connection(), exclusive=fix)
+    drifted = 0
+    for model, key in ROLLUPS:
+        rows = drift(model, key, watermark)
+        for object_id, stored_upcoming, stored_past, upcoming, past in rows:
+            click.echo('{} {}: upcoming {} (stored {}), past {} (stored {})'.format(
+                model.__tablename__, object_id, upcoming, stored_upcoming, past, stored_past
+            ))
+        if fix and rows:
+            table = model.__table__
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('object_id')).values(
+                    upcoming_show_count=bindparam('upcoming'), past_show_count=bindparam('past')
+                ),
+                [{'object_id': row[0], 'upcoming': row[3], 'past': row[4]} for row in rows]
+            )
+            mark_written(db.session, [table.name])
+        drifted += len(rows)
+
+    if fix:
+        db.session.commit()
+        click.echo('{} rows fixed'.format(drifted))
+    elif drifted:
+        raise click.ClickException('{} rows drifted; run with --fix to repair them'.format(drifted))
+    else:
+        click.echo('Rollups are consistent')
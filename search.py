@@ -0,0 +1,81 @@
+import logging
+import re
+from flask import current_app
+from sqlalchemy import func, inspect, literal_column
+from models import db
+
+logger = logging.getLogger(__name__)
+
+#----------------------------------------------------------------------------#
+# Name search.
+#
+# SEARCH_MODE (config.py) selects how names are matched and ranked:
+#   'trigram'  - ILIKE '%term%' (served by the pg_trgm GIN index), ranked
+#                by similarity(name, term).
+#   'fulltext' - prefix match against the trigger-maintained search_vector
+#                column, ranked by ts_rank. The column is added by the
+#                migrations; a database built with create_all() has none,
+#                and falls back to 'trigram'.
+# Databases other than Postgres always use a plain ILIKE, ranked by how
+# much of the name the term covers.
+#----------------------------------------------------------------------------#
+
+def has_search_vector(model):
+    # Checked once per table and process.
+    columns = current_app.extensions.setdefault('search_vector', {})
+    table = model.__tablename__
+    if table not in columns:
+        columns[table] = any(
+            column['name'] == 'search_vector' for column in inspect(db.engine).get_columns(table)
+        )
+        if not columns[table]:
+            logger.warning('%s has no search_vector column, using trigram search', table)
+    return columns[table]
+
+
+def _name_match(model, term, mode, dialect):
+    if dialect == 'postgresql' and mode == 'fulltext' and has_search_vector(model):
+        words = re.findall(r'\w+', term)
+        if words:
+            search_vector = literal_column(model.__tablename__ + '.search_vector')
+            query = func.to_tsquery(
+                'pg_catalog.simple', ' & '.join(word + ':*' for word in words)
+            )
+            return search_vector.op('@@')(query), func.ts_rank(search_vector, query).desc()
+
+    name_filter = model.name.ilike('%' + term + '%')
+    if dialect == 'postgresql':
+        return name_filter, func.similarity(model.name, term).desc()
+    return name_filter, func.length(model.name)
+
+
+def search_by_name(model, term, limit=None, offset=None):
+    # Matching rows of `model` (Venue or Artist) with their upcoming show
+    # counts, read from the rollup column. Returns one page of at most
+    # SEARCH_MAX_PAGE_SIZE rows, SEARCH_PAGE_SIZE by default.
+    config = current_app.config
+    limit = max(1, min(limit or config['SEARCH_PAGE_SIZE'], config['SEARCH_MAX_PAGE_SIZE']))
+    offset = max(0, offset or 0)
+    name_filter, rank = _name_match(
+        model, term,
+        config.get('SEARCH_MODE', 'trigram'),
+        db.engine.dialect.name
+    )
+    count = db.session.query(func.count(model.id)).filter(name_filter).scalar()
+
+    query = db.session.query(
+        model.id,
+        model.name,
+        model.upcoming_show_count.label('upcoming_shows')
+    ).filter(name_filter).order_by(rank, model.name, model.id).offset(offset).limit(limit)
+
+    return {
+        "count": count,
+        "offset": offset,
+        "limit": limit,
+        "data": [{
+            "id": row.id,
+            "name": row.name,
+            "upcoming_shows": row.upcoming_shows
+        } for row in query]
+    }
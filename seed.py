@@ -0,0 +1,201 @@
+import io
+import random
+from bisect import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func
+from forms import VenueForm
+from models import db, Venue, Artist
+from bulk import import_rows
+
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#
+# `flask seed` generates venues, artists and shows from a seeded random
+# generator, so the same options always produce the same rows (given the
+# same --date; ids match too on an empty database). Popularity follows a
+# Zipf law with exponent --skew: a few cities hold most venues, a few
+# venues and artists get most of the shows and a few genres are far more
+# common than the rest. Shows are placed on a grid of evening slots so no
+# venue or artist is double-booked, and generated in start order. Rows go
+# through the bulk import, with the same validation, rollup counting and
+# conflict checks as any import.
+#----------------------------------------------------------------------------#
+
+STATES = [value for value, _ in VenueForm.state.kwargs['choices']]
+GENRES = [value for value, _ in VenueForm.genres.kwargs['choices']]
+
+CITY_PREFIXES = (
+    'North', 'South', 'East', 'West', 'New', 'Port', 'Lake', 'Fort', 'Mount', 'Glen',
+    'Cedar', 'Oak', 'River', 'Silver', 'Red', 'Green', 'Bay', 'Clear', 'Fair', 'Spring',
+)
+CITY_SUFFIXES = (
+    'field', 'ville', 'ton', 'wood', 'haven', 'port', 'dale', 'view', 'ridge', 'brook',
+    'burg', 'mont', 'side', 'ford', 'crest',
+)
+STREETS = ('Main', 'Market', 'Mission', 'Valencia', 'Broadway', 'Elm', 'Park', 'Union', 'Howard', 'Folsom')
+ADJECTIVES = (
+    'Blue', 'Velvet', 'Golden', 'Electric', 'Rusty', 'Midnight', 'Crimson', 'Hollow', 'Neon', 'Wild',
+    'Silent', 'Lucky', 'Broken', 'Paper', 'Iron', 'Copper', 'Lonesome', 'Atomic', 'Little', 'Grand',
+)
+VENUE_NOUNS = ('Room', 'Hall', 'Lounge', 'Tavern', 'Theatre', 'Ballroom', 'Cellar', 'Garden', 'Club', 'Stage')
+ARTIST_NOUNS = (
+    'Owls', 'Rivers', 'Machines', 'Saints', 'Wolves', 'Echoes', 'Kings', 'Ghosts', 'Horses', 'Sparrows',
+    'Trio', 'Quartet', 'Collective', 'Band', 'Orchestra',
+)
+
+# Shows start at one of these hours and last at most SLOT_HOURS, so shows
+# in different slots never overlap.
+SLOT_STARTS = (13, 17, 21)
+SLOT_HOURS = 4
+SHOW_MINUTES = (90, 120, 150, 180)
+
+
+class Popularity(object):
+    # Draws items with Zipf-distributed probabilities, the most popular
+    # items at random positions.
+
+    def __init__(self, rng, items, skew):
+        self.items = list(items)
+        weights = [1 / rank ** skew for rank in range(1, len(self.items) + 1)]
+        rng.shuffle(weights)
+        self.cumulative = list(accumulate(weights))
+        self.rng = rng
+
+    def draw(self):
+        return self.items[bisect(self.cumulative, self.rng.random() * self.cumulative[-1])]
+
+    def sample(self, count):
+        # `count` distinct items (fewer if there are not that many).
+        chosen = []
+        for _ in range(count * 4):
+            item = self.draw()
+            if item not in chosen:
+                chosen.append(item)
+                if len(chosen) == count:
+                    break
+        return chosen
+
+
+def slug(name):
+    return name.lower().replace(' ', '-')
+
+
+def fake_cities(rng, count):
+    names = [prefix + suffix for prefix in CITY_PREFIXES for suffix in CITY_SUFFIXES]
+    return [(name, rng.choice(STATES)) for name in rng.sample(names, min(count, len(names)))]
+
+
+def fake_venue(rng, number, city, genres):
+    name = '{} {} {}'.format(rng.choice(('The', city[0])), rng.choice(ADJECTIVES), rng.choice(VENUE_NOUNS))
+    seeking = rng.random() < 0.3
+    return {
+        'name': name,
+        'city': city[0],
+        'state': city[1],
+        'address': '{} {} St'.format(rng.randint(1, 3000), rng.choice(STREETS)),
+        'phone': '{:010d}'.format(rng.randrange(10 ** 10)),
+        'genres': genres.sample(rng.randint(1, 3)),
+        'image_link': 'https://images.example.com/venues/{}.jpg'.format(number),
+        'facebook_link': 'https://www.facebook.com/{}-{}'.format(slug(name), number),
+        'website_link': 'https://{}-{}.example.com'.format(slug(name), number),
+        'seeking_talent': seeking,
+        'seeking_description': 'Booking local acts on weeknights.' if seeking else '',
+    }
+
+
+def fake_artist(rng, number, city, genres):
+    name = '{} {}'.format(rng.choice(ADJECTIVES), rng.choice(ARTIST_NOUNS))
+    seeking = rng.random() < 0.3
+    return {
+        'name': name,
+        'city': city[0],
+        'state': city[1],
+        'phone': '{:010d}'.format(rng.randrange(10 ** 10)),
+        'genres': genres.sample(rng.randint(1, 2)),
+        'image_link': 'https://images.example.com/artists/{}.jpg'.format(number),
+        'facebook_link': 'https://www.facebook.com/{}-{}'.format(slug(name), number),
+        'website_link': 'https://{}-{}.example.com'.format(slug(name), number),
+        'seeking_venue': seeking,
+        'seeking_description': 'Looking for a Friday residency.' if seeking else '',
+    }
+
+
+def fake_shows(rng, count, venues, artists, first_day, days):
+    # Yields up to `count` shows in start order, spread evenly over the
+    # slots; a show whose venue or artist is still taken in its slot after
+    # a few draws is dropped. Going slot by slot keeps each import batch to
+    # a few days, so its conflict check reads few existing shows.
+    slots = days * len(SLOT_STARTS)
+    for slot in range(slots):
+        day, number = divmod(slot, len(SLOT_STARTS))
+        start_time = first_day + timedelta(days=day, hours=SLOT_STARTS[number])
+        booked_venues = set()
+        booked_artists = set()
+        for _ in range(count * (slot + 1) // slots - count * slot // slots):
+            for _ in range(10):
+                venue_id = venues.draw()
+                artist_id = artists.draw()
+                if venue_id not in booked_venues and artist_id not in booked_artists:
+                    break
+            else:
+                continue
+            booked_venues.add(venue_id)
+            booked_artists.add(artist_id)
+            yield {
+                'venue_id': venue_id,
+                'artist_id': artist_id,
+                'start_time': start_time,
+                'end_time': start_time + timedelta(minutes=rng.choice(SHOW_MINUTES)),
+            }
+
+
+def seed_rows(kind, rows, batch_size):
+    # Imports rows of `kind` and returns the ids they were given.
+    model = Venue if kind == 'venues' else Artist
+    first_id = (db.session.query(func.max(model.id)).scalar() or 0) + 1
+    imported, rejected = import_rows(kind, rows, batch_size, io.StringIO())
+    if rejected:
+        click.echo('{}: {} generated rows rejected'.format(kind, rejected))
+    return [row.id for row in db.session.query(model.id).filter(model.id >= first_id).order_by(model.id)]
+
+
+@click.command('seed')
+@click.option('--venues', 'venue_count', default=1000, show_default=True)
+@click.option('--artists', 'artist_count', default=2000, show_default=True)
+@click.option('--shows', 'show_count', default=20000, show_default=True)
+@click.option('--cities', 'city_count', default=150, show_default=True,
+              help='Number of distinct cities (at most {}).'.format(len(CITY_PREFIXES) * len(CITY_SUFFIXES)))
+@click.option('--days', default=180, show_default=True, help='Shows fall within this many days either side of --date.')
+@click.option('--date', 'anchor', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Day the show dates are centred on; defaults to today (UTC).')
+@click.option('--skew', default=1.1, show_default=True, help='Zipf exponent of city, venue, artist and genre popularity.')
+@click.option('--seed', 'seed_value', default=1, show_default=True, help='Random seed.')
+@click.option('--batch-size', default=5000, show_default=True)
+@with_appcontext
+def seed_command(venue_count, artist_count, show_count, city_count, days, anchor, skew, seed_value, batch_size):
+    """Fill the database with generated venues, artists and shows."""
+    rng = random.Random(seed_value)
+    anchor = anchor or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    cities = Popularity(rng, fake_cities(rng, city_count), skew)
+    genres = Popularity(rng, GENRES, skew)
+
+    venue_ids = seed_rows('venues', (
+        fake_venue(rng, number, cities.draw(), genres) for number in range(venue_count)
+    ), batch_size)
+    artist_ids = seed_rows('artists', (
+        fake_artist(rng, number, cities.draw(), genres) for number in range(artist_count)
+    ), batch_size)
+    if venue_ids and artist_ids:
+        shows = fake_shows(
+            rng, show_count, Popularity(rng, venue_ids, skew), Popularity(rng, artist_ids, skew),
+            anchor - timedelta(days=days), 2 * days
+        )
+        imported, rejected = import_rows('shows', shows, batch_size, io.StringIO())
+    else:
+        imported, rejected = 0, 0
+    click.echo('Seeded {} venues, {} artists and {} shows ({} shows rejected)'.format(
+        len(venue_ids), len(artist_ids), imported, rejected
+    ))
@@ -0,0 +1,51 @@
+import os
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache, TemplateSyntaxError
+
+#----------------------------------------------------------------------------#
+# Templates.
+#
+# Compiled templates are kept in a FileSystemBytecodeCache under
+# TEMPLATE_CACHE_DIR, shared by all workers and kept across restarts, so a
+# new worker loads bytecode instead of parsing and compiling every
+# template again. `flask templates compile` fills the cache at build time.
+# Entries are keyed by a checksum of the template source, so an edited
+# template is recompiled rather than served stale. Outside debug mode the
+# environment no longer stats template files on every render.
+#----------------------------------------------------------------------------#
+
+def init_app(app):
+    cache_dir = app.config.get('TEMPLATE_CACHE_DIR')
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    auto_reload = app.config.get('TEMPLATES_AUTO_RELOAD')
+    app.jinja_env.auto_reload = app.debug if auto_reload is None else auto_reload
+
+
+@click.group('templates')
+def templates_command():
+    """Manage the compiled template cache."""
+
+
+@templates_command.command('compile')
+@with_appcontext
+def compile_command():
+    """Compile every template into the bytecode cache."""
+    env = current_app.jinja_env
+    if env.bytecode_cache is None:
+        raise click.ClickException('TEMPLATE_CACHE_DIR is not set')
+    env.bytecode_cache.clear()
+    started = time.perf_counter()
+    names = env.list_templates(extensions=['html'])
+    for name in names:
+        try:
+            env.get_template(name)
+        except TemplateSyntaxError as error:
+            raise click.ClickException('{}:{}: {}'.format(name, error.lineno, error.message))
+    click.echo('Compiled {} templates in {:.0f}ms into {}'.format(
+        len(names), (time.perf_counter() - started) * 1000, current_app.config['TEMPLATE_CACHE_DIR']
+    ))
@@ -0,0 +1,62 @@
+import os
+import sys
+from datetime import datetime, timedelta
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as fyyur
+from cache import page_cache
+from models import db, Venue, Artist, Show, Genre
+
+
+@pytest.fixture
+def app(tmp_path):
+    # The app on a fresh SQLite database with an empty page cache.
+    fyyur.config.update(
+        SQLALCHEMY_DATABASE_URI='sqlite:///' + str(tmp_path / 'fyyur.db'),
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+    )
+    page_cache.clear()
+    with fyyur.app_context():
+        db.create_all()
+    yield fyyur
+    page_cache.clear()
+    with fyyur.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def add_venue(name='The Blue Room', city='Portville', state='CA', genres=('Jazz',)):
+    venue = Venue(
+        name=name, city=city, state=state, address='1 Main St', phone='5551234567',
+        genres=Genre.from_names(genres)
+    )
+    db.session.add(venue)
+    db.session.commit()
+    return venue
+
+
+def add_artist(name='Velvet Owls', genres=('Jazz',)):
+    artist = Artist(name=name, city='Portville', state='CA', phone='5551234567', genres=Genre.from_names(genres))
+    db.session.add(artist)
+    db.session.commit()
+    return artist
+
+
+def add_show(venue, artist, start_time, hours=2):
+    show = Show(venue_id=venue.id, artist_id=artist.id, start_time=start_time,
+                end_time=start_time + timedelta(hours=hours))
+    db.session.add(show)
+    db.session.commit()
+    return show
+
+
+def in_days(days):
+    return datetime.utcnow() + timedelta(days=days)
@@ -0,0 +1,44 @@
+from sqlalchemy import event
+from conftest import add_venue
+from models import db
+
+
+def statements_during(client, *args, **kwargs):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with client.application.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(*args, **kwargs)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return response, statements
+
+
+def test_list_etags_do_not_count_rows(app, client):
+    with app.app_context():
+        for number in range(3):
+            add_venue(name='Venue {}'.format(number))
+
+    first = client.get('/api/v1/venues?limit=2')
+    second = client.get('/api/v1/venues?limit=2&cursor=' + first.get_json()['next_cursor'])
+    assert first.headers['ETag'] == second.headers['ETag']
+
+    response, statements = statements_during(
+        client, '/api/v1/venues?limit=2&cursor=' + first.get_json()['next_cursor'],
+        headers={'If-None-Match': second.headers['ETag']}
+    )
+    assert response.status_code == 304
+    assert len(statements) == 1
+    assert 'table_version' in statements[0]
+    assert 'count(' not in statements[0].lower()
+
+    with app.app_context():
+        add_venue(name='Venue 3')
+    response = client.get('/api/v1/venues?limit=2', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != first.headers['ETag']
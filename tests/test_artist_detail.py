@@ -0,0 +1,46 @@
+from datetime import datetime
+from sqlalchemy import event
+from models import db, Artist
+from queries import get_artist_detail
+from seed import seed_command
+
+
+def busiest_artist():
+    return db.session.query(Artist.id).order_by(
+        (Artist.upcoming_show_count + Artist.past_show_count).desc(), Artist.id
+    ).first().id
+
+
+def detail_statements(artist_id):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.session.remove()
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        detail = get_artist_detail(artist_id, datetime.utcnow())
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return detail, statements
+
+
+def seed(app, venues, artists, shows):
+    result = app.test_cli_runner().invoke(seed_command, [
+        '--venues', str(venues), '--artists', str(artists), '--shows', str(shows), '--date', '2026-01-01'
+    ])
+    assert result.exit_code == 0, result.output
+
+
+def test_artist_detail_statement_count_does_not_grow_with_catalogue(app):
+    with app.app_context():
+        seed(app, 5, 5, 20)
+        small, small_statements = detail_statements(busiest_artist())
+
+        seed(app, 100, 100, 3000)
+        large, large_statements = detail_statements(busiest_artist())
+
+    shows = lambda detail: detail['past_shows_count'] + detail['upcoming_shows_count']
+    assert shows(large) > 5 * shows(small)
+    assert len(large_statements) == len(small_statements) <= 2
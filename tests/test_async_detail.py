@@ -0,0 +1,41 @@
+import asyncio
+import concurrent.futures
+from datetime import datetime, timezone
+import pytest
+from aio import event_loop, get_venue_detail_concurrently, get_artist_detail_concurrently
+from models import db
+from queries import get_venue_detail, get_artist_detail
+from seed import seed_command
+
+
+
+def test_async_detail_matches_sync_detail_and_reuses_one_engine(app):
+    pytest.importorskip('aiosqlite')
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    with app.app_context():
+        result = app.test_cli_runner().invoke(seed_command, [
+            '--venues', '10', '--artists', '10', '--shows', '100', '--date', '2026-01-01'
+        ])
+        assert result.exit_code == 0, result.output
+        with app.test_request_context('/'):
+            for object_id in range(1, 4):
+                assert get_venue_detail_concurrently(object_id, now) == get_venue_detail(object_id, now)
+                assert get_artist_detail_concurrently(object_id, now) == get_artist_detail(object_id, now)
+            assert get_venue_detail_concurrently(999, now) is None
+        assert str(db.engine.url).replace('sqlite', 'sqlite+aiosqlite', 1) in event_loop.engines
+
+
+def test_stalled_query_times_out_instead_of_hanging():
+    cancelled = []
+
+    async def stall():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(concurrent.futures.TimeoutError):
+        event_loop.run(stall(), 0.05)
+    event_loop.run(asyncio.sleep(0.01), 5)
+    assert cancelled
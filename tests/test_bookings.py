@@ -0,0 +1,70 @@
+import io
+from datetime import datetime, timedelta
+from conftest import add_venue, add_artist, add_show
+from bookings import sweep, find_conflicts, batch_conflicts
+from bulk import import_rows
+
+DAY = datetime(2026, 3, 1, 20)
+
+
+def hours(start, end):
+    return DAY + timedelta(hours=start), DAY + timedelta(hours=end)
+
+
+def test_sweep_pairs_overlaps_but_not_back_to_back_intervals():
+    intervals = [hours(0, 2) + ('a',), hours(2, 4) + ('b',), hours(1, 3) + ('c',), hours(5, 9) + ('d',),
+                 hours(6, 7) + ('e',)]
+    assert sorted(sweep(intervals)) == [('a', 'c'), ('c', 'b'), ('d', 'e')]
+
+
+def test_find_conflicts_by_venue_or_artist(app):
+    with app.app_context():
+        venue, other_venue = add_venue(), add_venue(name='The Red Room')
+        artist, other_artist = add_artist(), add_artist(name='Paper Kings')
+        at_venue = add_show(venue, other_artist, DAY, hours=2)
+        with_artist = add_show(other_venue, artist, DAY + timedelta(hours=4), hours=2)
+        long_show = add_show(other_venue, other_artist, DAY - timedelta(hours=20), hours=19)
+
+        def conflicts(start, end):
+            return [show.id for show in find_conflicts(venue.id, artist.id, *hours(start, end))]
+
+        assert conflicts(1, 5) == [at_venue.id, with_artist.id]
+        # Back to back with both shows.
+        assert conflicts(2, 4) == []
+        assert conflicts(-1, 0) == []
+        assert conflicts(5, 7) == [with_artist.id]
+        # Started 20 hours before the window, within SHOW_MAX_DURATION_HOURS.
+        assert [show.id for show in find_conflicts(
+            venue.id, other_artist.id, *hours(-2, 0)
+        )] == [long_show.id]
+
+
+def test_batch_conflicts_against_existing_shows_and_earlier_rows(app):
+    with app.app_context():
+        venue, other_venue = add_venue(), add_venue(name='The Red Room')
+        artist = add_artist()
+        add_show(venue, artist, DAY, hours=2)
+
+        def row(venue_id, start, end):
+            start_time, end_time = hours(start, end)
+            return {'venue_id': venue_id, 'artist_id': artist.id, 'start_time': start_time, 'end_time': end_time}
+
+        rows = [
+            row(venue.id, 1, 3),        # overlaps the existing show
+            row(other_venue.id, 2, 4),  # back to back with it
+            row(other_venue.id, 3, 5),  # overlaps the row before
+            row(venue.id, 5, 6),        # back to back with the row before
+            row(other_venue.id, 6, 7),
+        ]
+        assert batch_conflicts(rows) == {0, 2}
+
+
+def test_shows_longer_than_the_maximum_are_rejected(app):
+    with app.app_context():
+        venue, artist = add_venue(), add_artist()
+        start, end = hours(0, 30)
+        rejects = io.StringIO()
+        assert import_rows('shows', [{
+            'venue_id': venue.id, 'artist_id': artist.id, 'start_time': str(start), 'end_time': str(end)
+        }], 10, rejects) == (0, 1)
+        assert 'at most 24 hours' in rejects.getvalue()
@@ -0,0 +1,26 @@
+import io
+import json
+from conftest import add_venue, add_artist, in_days
+from bulk import import_rows
+from models import db, Show
+
+
+def test_bad_show_rows_are_rejected_without_the_batch(app):
+    with app.app_context():
+        venue = add_venue()
+        artist = add_artist()
+        start = in_days(3).replace(microsecond=0)
+        rows = [
+            {'venue_id': venue.id, 'artist_id': artist.id},
+            {'venue_id': venue.id, 'artist_id': artist.id + 100, 'start_time': str(start)},
+            {'venue_id': venue.id + 100, 'artist_id': artist.id, 'start_time': str(start)},
+            {'venue_id': venue.id, 'artist_id': artist.id, 'start_time': str(start)},
+        ]
+        rejects = io.StringIO()
+        assert import_rows('shows', rows, 100, rejects) == (1, 3)
+
+        errors = {entry['row']: entry['errors'] for entry in map(json.loads, rejects.getvalue().splitlines())}
+        assert 'start_time' in errors[1]
+        assert errors[2] == 'unknown artist_id {}'.format(artist.id + 100)
+        assert errors[3] == 'unknown venue_id {}'.format(venue.id + 100)
+        assert [show.start_time for show in db.session.query(Show)] == [start]
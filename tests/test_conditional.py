@@ -0,0 +1,41 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from cache import page_cache
+from models import Venue
+from conftest import add_venue
+
+
+def test_page_changed_elsewhere_is_not_served_from_cache(app, client):
+    with app.app_context():
+        venue_id = add_venue(name='The Blue Room').id
+
+    first = client.get('/venues')
+    assert first.status_code == 200
+    assert b'The Blue Room' in first.data
+
+    # Another process (e.g. `flask rollups refresh` or a second worker)
+    # changes the row, so this worker's page cache is not invalidated.
+    engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+    with Session(engine) as other:
+        other.get(Venue, venue_id).name = 'The Red Room'
+        other.commit()
+    engine.dispose()
+
+    second = client.get('/venues')
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert b'The Red Room' in second.data
+    assert b'The Blue Room' not in second.data
+
+    assert client.get('/venues', headers={'If-None-Match': second.headers['ETag']}).status_code == 304
+    assert client.get('/venues', headers={'If-None-Match': first.headers['ETag']}).status_code == 200
+
+
+def test_unchanged_page_is_served_from_cache(app, client):
+    with app.app_context():
+        add_venue()
+    first = client.get('/venues')
+    hits = page_cache.stats()['hits']
+    second = client.get('/venues')
+    assert page_cache.stats()['hits'] == hits + 1
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert second.data == first.data
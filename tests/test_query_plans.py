@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+import pytest
+from sqlalchemy import event
+from bookings import find_conflicts
+from models import db, Venue, Artist, Show
+from queries import detail_version, get_venue_directory, get_show_calendar, parse_calendar_bound
+from seed import seed_command
+
+
+@pytest.fixture
+def seeded(app):
+    with app.app_context():
+        result = app.test_cli_runner().invoke(seed_command, [
+            '--venues', '300', '--artists', '300', '--shows', '3000', '--date', '2026-01-01'
+        ])
+        assert result.exit_code == 0, result.output
+        db.session.execute('ANALYZE')
+        db.session.commit()
+        yield app
+
+
+def query_plans(run):
+    # EXPLAIN QUERY PLAN details of every statement `run` executes.
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        run()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+    connection = db.session.connection()
+    return [
+        ' | '.join(row[3] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters))
+        for statement, parameters in statements
+    ]
+
+
+def test_venue_time_window_uses_venue_start_time_index(seeded):
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    plans = query_plans(lambda: detail_version(Venue, Show.venue_id, Artist, Show.artist_id, 1, now))
+    assert 'SEARCH show USING INDEX ix_show_venue_id_start_time' in plans[0]
+
+
+def test_artist_time_window_uses_artist_start_time_index(seeded):
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    plans = query_plans(lambda: detail_version(Artist, Show.artist_id, Venue, Show.venue_id, 1, now))
+    assert 'SEARCH show USING INDEX ix_show_artist_id_start_time' in plans[0]
+
+
+def test_venue_directory_uses_city_state_index(seeded):
+    plans = query_plans(get_venue_directory)
+    assert 'SCAN venue USING INDEX ix_venue_city_state' in plans[0]
+
+
+def test_calendar_by_area_uses_city_state_and_time_window_indexes(seeded):
+    city, state = db.session.query(Venue.city, Venue.state).first()
+    plans = query_plans(lambda: get_show_calendar(
+        parse_calendar_bound('2026-01-01'), parse_calendar_bound('2026-01-08', end=True), city, state, None
+    ))
+    assert 'SEARCH venue USING INDEX ix_venue_city_state (city=? AND state=?)' in plans[0]
+    assert 'SEARCH show USING INDEX ix_show_venue_id_start_time (venue_id=? AND start_time>? AND start_time<?)' in plans[0]
+
+
+def test_booking_conflicts_search_a_bounded_time_window(seeded):
+    start = datetime(2026, 1, 1, 20)
+    plans = query_plans(lambda: find_conflicts(1, 1, start, start.replace(hour=22)))
+    assert 'SEARCH show USING INDEX ix_show_venue_id_start_time (venue_id=? AND start_time>? AND start_time<?)' in plans[0]
+    assert 'SEARCH show USING INDEX ix_show_artist_id_start_time (artist_id=? AND start_time>? AND start_time<?)' in plans[0]
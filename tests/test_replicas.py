@@ -0,0 +1,78 @@
+import random
+import time
+import shutil
+import pytest
+from cache import page_cache
+from conftest import add_venue
+from database import ReplicaSet
+from models import db
+from seed import Popularity, GENRES, fake_venue
+
+
+@pytest.fixture
+def replica_app(app, tmp_path):
+    # A second SQLite file stands in for a replica that stopped replicating
+    # once the venue was created.
+    with app.app_context():
+        venue_id = add_venue(name='The Blue Room').id
+        db.engine.dispose()
+    shutil.copy(str(tmp_path / 'fyyur.db'), str(tmp_path / 'replica.db'))
+    app.config['SQLALCHEMY_BINDS'] = {'replica_0': 'sqlite:///' + str(tmp_path / 'replica.db')}
+    db.replicas = ReplicaSet(db, app, ['replica_0'])
+    app.venue_id = venue_id
+    yield app
+    db.replicas.stop_checks()
+    db.replicas = None
+    app.config['SQLALCHEMY_BINDS'] = None
+
+
+def test_writer_reads_own_write_past_cached_replica_page(replica_app):
+    venue_id = replica_app.venue_id
+    writer = replica_app.test_client()
+    reader = replica_app.test_client()
+
+    rng = random.Random(1)
+    data = fake_venue(rng, 1, ('Portville', 'CA'), Popularity(rng, GENRES, 1.1))
+    data['name'] = 'The Red Room'
+    assert writer.post('/venues/{}/edit'.format(venue_id), data=data).status_code == 302
+
+    # Not pinned: reads the lagging replica, and the page gets cached.
+    for _ in range(2):
+        page = reader.get('/venues/{}'.format(venue_id))
+        assert b'The Blue Room' in page.data
+
+    # Pinned to the primary for REPLICA_STICKY_SECONDS after the write,
+    # and kept away from the page cache both ways.
+    stats = page_cache.stats()
+    for _ in range(2):
+        page = writer.get('/venues/{}'.format(venue_id))
+        assert b'The Red Room' in page.data
+    assert page_cache.stats() == stats
+
+
+def test_deleter_stops_seeing_deleted_venue(replica_app):
+    venue_id = replica_app.venue_id
+    writer = replica_app.test_client()
+    reader = replica_app.test_client()
+
+    # Deleted with Query.delete(), which never flushes.
+    writer.delete('/venues/{}'.format(venue_id))
+    with writer.session_transaction() as flask_session:
+        assert '_primary_until' in flask_session
+
+    assert reader.get('/venues/{}'.format(venue_id)).status_code == 200
+    assert writer.get('/venues/{}'.format(venue_id)).status_code == 404
+
+
+def test_health_checks_run_off_the_request_thread(replica_app):
+    replicas = db.replicas
+    replicas.check_interval = 0.01
+    replica_app.config['SQLALCHEMY_BINDS']['replica_0'] = 'sqlite:////nonexistent/replica.db'
+    replicas.engines.clear()
+    with replica_app.test_request_context('/'):
+        replicas.choose()
+    deadline = time.monotonic() + 5
+    while replicas.is_up('replica_0') and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not replicas.is_up('replica_0')
+    assert replicas.choose() is None
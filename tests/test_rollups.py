@@ -0,0 +1,20 @@
+from datetime import timedelta
+from conftest import add_venue, add_artist, add_show, in_days
+from models import db, Venue, Artist
+from rollups import refresh
+
+
+def test_refresh_moves_started_shows_to_past(app):
+    with app.app_context():
+        venues = [add_venue(name='Venue {}'.format(number)) for number in range(2)]
+        artists = [add_artist(name='Artist {}'.format(number)) for number in range(2)]
+        for venue, artist in zip(venues, artists):
+            add_show(venue, artist, in_days(1))
+        add_show(venues[0], artists[0], in_days(10))
+
+        assert refresh(in_days(2)) == 2
+        for model in (Venue, Artist):
+            counts = db.session.query(model.upcoming_show_count, model.past_show_count).order_by(model.id).all()
+            assert counts == [(1, 1), (0, 1)]
+
+        assert refresh(in_days(2) - timedelta(hours=1)) == 0
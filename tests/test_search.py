@@ -0,0 +1,43 @@
+from sqlalchemy import text
+from conftest import add_venue
+from models import db, Venue
+from search import has_search_vector
+
+
+def test_search_vector_is_detected_once_per_table(app):
+    with app.app_context():
+        app.extensions.pop('search_vector', None)
+        # create_all() does not add the migration-only column.
+        assert not has_search_vector(Venue)
+        db.session.execute(text('ALTER TABLE venue ADD COLUMN search_vector TEXT'))
+        db.session.commit()
+        assert not has_search_vector(Venue)
+        app.extensions.pop('search_vector')
+        assert has_search_vector(Venue)
+        app.extensions.pop('search_vector')
+
+
+def test_search_pages_are_bounded(app, client):
+    with app.app_context():
+        for number in range(25):
+            add_venue(name='Room {:02d}'.format(number))
+
+    page = client.post('/venues/search', data={'search_term': 'room'})
+    assert page.status_code == 200
+    assert page.data.count(b'<h5>Room') == app.config['SEARCH_PAGE_SIZE']
+    assert b'More results' in page.data
+
+    page = client.post('/venues/search', data={'search_term': 'room', 'offset': 20})
+    assert page.data.count(b'<h5>Room') == 5
+    assert b'More results' not in page.data
+
+    page = client.post('/venues/search', data={'search_term': 'room', 'limit': -5, 'offset': -3})
+    assert page.status_code == 200
+    assert page.data.count(b'<h5>Room') == 1
+
+    app.config['SEARCH_MAX_PAGE_SIZE'], saved = 10, app.config['SEARCH_MAX_PAGE_SIZE']
+    try:
+        page = client.post('/venues/search', data={'search_term': 'room', 'limit': 1000})
+    finally:
+        app.config['SEARCH_MAX_PAGE_SIZE'] = saved
+    assert page.data.count(b'<h5>Room') == 10
@@ -0,0 +1,17 @@
+import warnings
+import templating
+
+
+def test_auto_reload_follows_config_without_deprecated_attributes(app):
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        templating.init_app(app)
+        assert not app.jinja_env.auto_reload
+
+        app.config['TEMPLATES_AUTO_RELOAD'] = True
+        try:
+            templating.init_app(app)
+            assert app.jinja_env.auto_reload
+        finally:
+            app.config['TEMPLATES_AUTO_RELOAD'] = None
+            templating.init_app(app)
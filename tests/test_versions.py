@@ -0,0 +1,50 @@
+import io
+from datetime import timedelta
+from conftest import add_venue, add_artist, add_show, in_days
+from bulk import import_rows
+from models import db, Venue, Show
+from queries import collection_version, shows_version
+from rollups import refresh
+
+
+def test_writes_move_the_versions_and_reads_do_not(app):
+    with app.app_context():
+        venue = add_venue()
+        artist = add_artist()
+        before = collection_version(Venue), shows_version()
+        db.session.query(Venue).all()
+        db.session.commit()
+        assert (collection_version(Venue), shows_version()) == before
+
+        show = add_show(venue, artist, in_days(0) + timedelta(minutes=1))
+        assert shows_version() != before[1]
+        # Adding a show changes the venue's upcoming count.
+        assert collection_version(Venue) != before[0]
+
+        versions = collection_version(Venue)
+        refresh(in_days(1))
+        assert collection_version(Venue) != versions
+
+        versions = shows_version()
+        db.session.query(Show).filter(Show.id == show.id).delete()
+        db.session.commit()
+        assert shows_version() != versions
+
+        versions = collection_version(Venue)
+        assert import_rows('venues', [dict(
+            name='The Red Room', city='Portville', state='CA', address='2 Main St', phone='5551234567',
+            genres=['Jazz'], image_link='https://example.com/red.jpg',
+            facebook_link='https://www.facebook.com/red', website_link='https://red.example.com'
+        )], 100, io.StringIO()) == (1, 0)
+        assert collection_version(Venue) != versions
+
+
+def test_rolled_back_writes_leave_the_versions_alone(app):
+    with app.app_context():
+        add_venue()
+        versions = collection_version(Venue)
+        db.session.add(Venue(name='The Red Room', city='Portville', state='CA', address='2 Main St', phone='1'))
+        db.session.flush()
+        db.session.rollback()
+        add_artist()
+        assert collection_version(Venue) == versions